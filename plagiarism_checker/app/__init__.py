@@ -1,4 +1,4 @@
-from flask import Flask, redirect, url_for
+from flask import Flask, redirect, url_for, request, flash
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
@@ -7,13 +7,56 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
+def configure_file_logging(app) -> None:
+    """Запись журнала приложения в файл, который читает просмотр журнала."""
+    import logging
+    import logging.handlers
+    import os
+    from app.log_reader import LOG_FORMAT
+    from config import LOG_FOLDER
+
+    path = os.path.join(LOG_FOLDER, app.config['LOG_FILE'])
+    if any(getattr(handler, 'baseFilename', None) == path
+           for handler in app.logger.handlers):
+        return
+    os.makedirs(LOG_FOLDER, exist_ok=True)
+    # WatchedFileHandler открывает файл заново после ротации; записи из
+    # рабочих процессов serve.py дописываются в конец (O_APPEND)
+    handler = logging.handlers.WatchedFileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    app.logger.addHandler(handler)
+
+
 def create_app():
+    from app.uploads import UploadRequest
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object(Config)
+    # Логгеры app.* (в том числе app.core) пишут через логгер приложения
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    if app.config['LOG_FILE']:
+        configure_file_logging(app)
 
     db.init_app(app)
     login_manager.init_app(app)
 
+    from app.admission import admission
+    admission.init_app(app)
+
+    from app.identity import identity_cache
+    identity_cache.init_app(app)
+
+    from app.audit import audit
+    audit.init_app(app)
+
+    from app.partitions import partitions
+    partitions.init_app(app)
+
+    from app.core.extraction import configure_extraction
+    configure_extraction(app.config['EXTRACTION_WORKERS'],
+                         app.config['EXTRACTION_TIMEOUT'],
+                         app.config['EXTRACTION_MEMORY_LIMIT_MB'] * 1024 * 1024)
+
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
 
@@ -31,7 +74,18 @@ def create_app():
     def index():
         return redirect(url_for('auth.login'))
 
-    with app.app_context():
-        db.create_all()
+    @app.errorhandler(413)
+    def upload_too_large(e):
+        limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        flash(f'Файл слишком большой (максимум {limit_mb} МБ)')
+        return redirect(request.url)
+
+    from app.cli import register_cli
+    register_cli(app)
+
+    if app.config['CORPUS_WARM_ON_START']:
+        from app.core.corpus_index import warm_corpus_cache
+        from config import DB_FOLDER, INDEX_FOLDER
+        warm_corpus_cache(DB_FOLDER, INDEX_FOLDER)
 
     return app
@@ -1,8 +1,31 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import Response, current_app, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app.models import User
 from app.admin import bp
 from app.admin.services import get_all_users, get_user_by_id, create_user, update_user
+from app.admin.services import backup_database, optimize_database, update_sources as update_sources_job
+from app.admin.services import rescore_reports as rescore_reports_job
+from app.admin.services import list_sources, delete_sources, compact_index, query_events
+from app.admin.services import parse_users_csv, import_users as import_users_job
+from app.admin.services import IMPORT_ERRORS_SHOWN, load_partition
+from app.core.stages import STAGES, STAGE_TITLES
+from app.admission import admission
+from app.identity import identity_cache
+from app.audit import audit, ACTION_TITLES, ALERT_LEVELS
+from app.jobs import jobs
+from app.log_reader import LogDirectory, LOG_LEVELS
+from app.partitions import partitions, PARTITION_TITLES, GLOBAL_PARTITION
+from app.settings import get_cascade_settings, save_cascade_settings
+from config import DB_FOLDER, INDEX_FOLDER, BACKUP_FOLDER, LOG_FOLDER
+
+MAINTENANCE_JOBS = ('backup_db', 'optimize_db', 'update_sources', 'rescore_reports',
+                    'compact_index', 'load_partition')
+SOURCES_PER_PAGE = 50
+EVENTS_PER_PAGE = 50
+LOG_RECORDS_PER_PAGE = 100
+
+# Индексы файлов журнала живут, пока жив процесс
+log_directory = LogDirectory(LOG_FOLDER)
 
 
 @bp.route('/dashboard')
@@ -41,11 +64,67 @@ def add_user():
             flash('Пользователь с таким email уже существует')
         else:
             create_user(name, email, role, password)
+            audit.record('user_created', f'{email} ({role})')
             flash('Пользователь добавлен')
             return redirect(url_for('admin.user_list'))
     return render_template('admin/add_user.html')
 
 
+@bp.route('/import_users', methods=['GET', 'POST'])
+@login_required
+def import_users():
+    """Массовый импорт пользователей из CSV (name, email, role, password)."""
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    recent = jobs.recent(['import_users'], 1)
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if recent and recent[0].active:
+            flash('Импорт уже выполняется')
+        elif not file or not file.filename:
+            flash('Выберите файл CSV')
+        else:
+            try:
+                rows = parse_users_csv(file.read())
+            except ValueError as e:
+                flash(f'Неверный файл: {e}')
+            else:
+                if not rows:
+                    flash('В файле нет пользователей')
+                else:
+                    jobs.submit('import_users', import_users_job, rows,
+                                current_app.config['USER_IMPORT_WORKERS'],
+                                user_id=current_user.id, owner_id=current_user.id,
+                                title=f'Импорт пользователей ({len(rows)} строк)',
+                                exclusive=True)
+                    flash('Импорт запущен')
+        return redirect(url_for('admin.import_users'))
+    return render_template('admin/import_users.html', job=recent[0] if recent else None,
+                           errors_shown=IMPORT_ERRORS_SHOWN)
+
+
+@bp.route('/import_users/<job_id>/errors.csv')
+@login_required
+def import_errors(job_id):
+    """Полный список ошибок импорта в CSV."""
+    import csv
+    import io
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    job = jobs.get(job_id)
+    if job is None or job.name != 'import_users' or not job.result:
+        flash('Отчёт об импорте не найден')
+        return redirect(url_for('admin.import_users'))
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['line', 'email', 'error'])
+    writer.writerows(job.result['errors'])
+    return Response('\ufeff' + output.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=import_errors.csv'})
+
+
 @bp.route('/edit_user/<int:user_id>', methods=['GET', 'POST'])
 @login_required
 def edit_user(user_id):
@@ -65,6 +144,7 @@ def edit_user(user_id):
                 flash('Email уже используется другим пользователем')
             else:
                 update_user(user_id, name, email, role)
+                audit.record('user_updated', f'#{user_id} {email} ({role})')
                 flash('Пользователь обновлён')
                 return redirect(url_for('admin.user_list'))
     return render_template('admin/edit_user.html', user=user)
@@ -83,11 +163,28 @@ def security_settings():
     return render_template('admin/security_settings.html')
 
 
-@bp.route('/algorithm_settings')
+@bp.route('/algorithm_settings', methods=['GET', 'POST'])
 @login_required
 def algorithm_settings():
-    flash('Алгоритмы: настройки открыты (заглушка)')
-    return render_template('admin/algorithm_settings.html')
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    if request.method == 'POST':
+        stages = [
+            {'stage': stage,
+             'top_k': request.form.get(f'{stage}_top_k', 0),
+             'min_score': request.form.get(f'{stage}_min_score', 0)}
+            for stage in STAGES if request.form.get(f'{stage}_enabled')
+        ]
+        try:
+            save_cascade_settings(stages)
+            flash('Настройки каскада сохранены')
+            return redirect(url_for('admin.algorithm_settings'))
+        except ValueError as e:
+            flash(str(e))
+    enabled = {stage['stage']: stage for stage in get_cascade_settings()}
+    return render_template('admin/algorithm_settings.html', stages=STAGES,
+                           titles=STAGE_TITLES, enabled=enabled)
 
 
 @bp.route('/database_settings')
@@ -100,30 +197,129 @@ def database_settings():
 @bp.route('/database_management')
 @login_required
 def database_management():
-    return render_template('admin/database_management.html')
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    recent_jobs = jobs.recent(MAINTENANCE_JOBS)
+    return render_template('admin/database_management.html', jobs=recent_jobs,
+                           running=any(job.active for job in recent_jobs))
 
 
-@bp.route('/backup_db')
+@bp.route('/corpus_partitions', methods=['GET', 'POST'])
+@login_required
+def corpus_partitions():
+    """Разделы базы: создание, загрузка индекса в память и выгрузка."""
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    if request.method == 'POST':
+        action = request.form.get('action')
+        name = request.form.get('name', '').strip()
+        if action == 'create':
+            try:
+                partitions.create(name)
+                flash(f'Раздел {name} создан')
+            except ValueError as e:
+                flash(str(e))
+        elif name not in partitions.names():
+            flash('Раздел не найден')
+        elif action == 'load':
+            jobs.submit('load_partition', load_partition, name,
+                        title=f'Загрузка раздела {name}', key=name)
+            flash(f'Загрузка раздела {name} запущена')
+        elif action == 'unload':
+            partitions.unload(name)
+            flash(f'Раздел {name} выгружен из памяти')
+        return redirect(url_for('admin.corpus_partitions'))
+    recent_jobs = jobs.recent(['load_partition'])
+    return render_template('admin/corpus_partitions.html', partitions=partitions.status(),
+                           jobs=recent_jobs, running=any(job.active for job in recent_jobs))
+
+
+@bp.route('/backup_db', methods=['POST'])
 @login_required
 def backup_db():
-    flash('Резервная копия успешно создана (заглушка)')
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    jobs.submit('backup_db', backup_database, BACKUP_FOLDER,
+                title='Резервное копирование', exclusive=True)
+    flash('Резервное копирование запущено')
     return redirect(url_for('admin.database_management'))
 
 
-@bp.route('/optimize_db')
+@bp.route('/optimize_db', methods=['POST'])
 @login_required
 def optimize_db():
-    flash('Оптимизация завершена (заглушка)')
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    jobs.submit('optimize_db', optimize_database, DB_FOLDER, INDEX_FOLDER,
+                title='Оптимизация БД и индекса', exclusive=True)
+    flash('Оптимизация запущена')
     return redirect(url_for('admin.database_management'))
 
 
-@bp.route('/update_sources')
+@bp.route('/update_sources', methods=['POST'])
 @login_required
 def update_sources():
-    flash('Обновление источников запущено (заглушка)')
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    jobs.submit('update_sources', update_sources_job, DB_FOLDER, INDEX_FOLDER,
+                title='Обновление источников', exclusive=True)
+    flash('Обновление источников запущено')
     return redirect(url_for('admin.database_management'))
 
 
+@bp.route('/rescore_reports', methods=['POST'])
+@login_required
+def rescore_reports():
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    jobs.submit('rescore_reports', rescore_reports_job, DB_FOLDER, INDEX_FOLDER,
+                title='Пересчёт отчётов по новым источникам', exclusive=True)
+    flash('Пересчёт отчётов запущен')
+    return redirect(url_for('admin.database_management'))
+
+
+@bp.route('/corpus_sources', methods=['GET', 'POST'])
+@login_required
+def corpus_sources():
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    query = request.args.get('q', '')
+    page = max(1, request.args.get('page', 1, type=int))
+    partition = request.args.get('partition', GLOBAL_PARTITION)
+    partition_names = partitions.names()
+    if partition not in partition_names:
+        flash('Раздел не найден')
+        return redirect(url_for('admin.corpus_sources'))
+    if request.method == 'POST':
+        names = request.form.getlist('names')
+        if not names:
+            flash('Источники не выбраны')
+        else:
+            deleted, garbage = delete_sources(partition, names)
+            flash(f'Удалено источников: {len(deleted)}')
+            if deleted:
+                prefix = '' if partition == GLOBAL_PARTITION else f'{partition}/'
+                audit.record('sources_deleted', ', '.join(prefix + name for name in deleted))
+            # Сжатие журнала, когда удалённых записей накопилось много
+            if garbage > current_app.config['CORPUS_COMPACT_RATIO']:
+                jobs.submit('compact_index', compact_index, partition,
+                            title=f'Сжатие индекса источников ({partition})', exclusive=True)
+                flash('Запущено сжатие индекса')
+        return redirect(url_for('admin.corpus_sources', partition=partition, q=query, page=page))
+    items, total = list_sources(partition, query, page, SOURCES_PER_PAGE)
+    pages = max(1, -(-total // SOURCES_PER_PAGE))
+    return render_template('admin/corpus_sources.html', items=items, total=total,
+                           query=query, page=page, pages=pages, partition=partition,
+                           partitions=partition_names, partition_titles=PARTITION_TITLES)
+
+
 @bp.route('/monitoring')
 @login_required
 def monitoring():
@@ -133,45 +329,141 @@ def monitoring():
 @bp.route('/system_stats')
 @login_required
 def system_stats():
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    checks = admission.metrics()
     return render_template('admin/system_stats.html', stats={
         'cpu': '23%',
         'ram': '1.2 GB / 8 GB',
         'active_users': '5',
-        'current_checks': '2'
-    })
+        'current_checks': checks['running']
+    }, checks=checks, identity=identity_cache, audit=audit)
+
+
+def _event_page(template, levels=None):
+    """Страница журнала событий с отбором из параметров запроса."""
+    from datetime import datetime, timedelta
+    args = request.args
+    since = until = before = None
+    try:
+        if args.get('since'):
+            since = datetime.strptime(args['since'], '%Y-%m-%d')
+        if args.get('until'):
+            # Включительно: до начала следующего дня
+            until = datetime.strptime(args['until'], '%Y-%m-%d') + timedelta(days=1)
+        if args.get('before'):
+            created, _, event_id = args['before'].rpartition('_')
+            before = (datetime.fromisoformat(created), int(event_id))
+    except ValueError:
+        flash('Неверный формат даты')
+    # События этого процесса, ещё не записанные фоновым потоком
+    audit.flush()
+    events, cursor = query_events(levels, args.get('email', '').strip(),
+                                  args.get('action'), since, until, before,
+                                  EVENTS_PER_PAGE)
+    filters = {key: args[key] for key in ('since', 'until', 'email', 'action')
+               if args.get(key)}
+    next_url = url_for(request.endpoint, before=f'{cursor[0].isoformat()}_{cursor[1]}',
+                       **filters) if cursor else None
+    return render_template(template, events=events, filters=filters,
+                           next_url=next_url, actions=ACTION_TITLES)
 
 
 @bp.route('/alerts_list')
 @login_required
 def alerts_list():
-    alerts = [
-        {'time': '2025-12-12 14:30', 'type': 'Warning',
-            'msg': 'Низкая уникальность у студента #102'},
-        {'time': '2025-12-13 09:15', 'type': 'Info',
-            'msg': 'Завершена обработка документа #45'}
-    ]
-    return render_template('admin/alerts_list.html', alerts=alerts)
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    return _event_page('admin/alerts_list.html', ALERT_LEVELS)
 
 
 @bp.route('/audit_log')
 @login_required
 def audit_log():
-    logs = [
-        {'user': 'admin', 'action': 'login', 'time': '2025-12-13 08:00'},
-        {'user': 'teacher@example.com', 'action': 'graded report #12',
-            'time': '2025-12-13 10:05'},
-    ]
-    return render_template('admin/audit_log.html', logs=logs)
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    return _event_page('admin/audit_log.html')
+
+
+def _log_request():
+    """Файл журнала и границы времени из параметров запроса."""
+    from datetime import datetime
+    args = request.args
+    names = log_directory.names()
+    name = args.get('file') or current_app.config['LOG_FILE']
+    if name not in names:
+        name = names[0] if names else None
+    bounds = {}
+    for key in ('since', 'until'):
+        if args.get(key):
+            try:
+                bounds[key] = datetime.strptime(args[key], '%Y-%m-%dT%H:%M')
+            except ValueError:
+                flash('Неверный формат времени')
+    return names, name, bounds
+
+
+def _log_offset():
+    try:
+        return max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return 0
 
 
 @bp.route('/log_viewer')
 @login_required
 def log_viewer():
-    return render_template('admin/log_viewer.html')
+    """
+    Просмотр журнала: последние записи, переход к моменту времени
+    (since) и листание страницами со смещения (offset).
+    """
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    names, name, bounds = _log_request()
+    page = None
+    if name is not None:
+        log = log_directory.get(name)
+        if 'offset' in request.args:
+            page = log.read(_log_offset(), LOG_RECORDS_PER_PAGE)
+        elif 'since' in bounds:
+            page = log.read(log.seek_time(bounds['since']), LOG_RECORDS_PER_PAGE)
+        else:
+            page = log.tail(LOG_RECORDS_PER_PAGE)
+    return render_template('admin/log_viewer.html', names=names, name=name,
+                           page=page, since=request.args.get('since', ''))
 
 
 @bp.route('/filter_log')
 @login_required
 def filter_log():
-    flash('Фильтр применён (заглушка)')
-    return redirect(url_for('admin.log_viewer'))
+    """
+    Поиск по журналу: уровни, подстрока и интервал времени. Начало
+    интервала находится по индексу, дальше файл читается страницами;
+    за один запрос просматривается ограниченный объём файла.
+    """
+    if current_user.role != 'admin':
+        flash('Доступ запрещён')
+        return redirect(url_for('auth.login'))
+    names, name, bounds = _log_request()
+    levels = [level for level in request.args.getlist('level') if level in LOG_LEVELS]
+    text = request.args.get('q', '').strip()
+    filters = {key: request.args[key] for key in ('since', 'until') if request.args.get(key)}
+    filters.update(file=name, q=text, level=levels)
+    page = None
+    if name is not None and (levels or text or bounds):
+        log = log_directory.get(name)
+        if 'offset' in request.args:
+            offset = _log_offset()
+        elif 'since' in bounds:
+            offset = log.seek_time(bounds['since'])
+        else:
+            offset = 0
+        page = log.read(offset, LOG_RECORDS_PER_PAGE, levels, text, bounds.get('until'))
+    next_url = url_for('admin.filter_log', offset=page.next_offset, **filters) \
+        if page is not None and not page.complete else None
+    return render_template('admin/filter_log.html', names=names, filters=filters,
+                           levels=LOG_LEVELS, page=page, next_url=next_url)
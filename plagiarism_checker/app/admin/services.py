@@ -1,4 +1,5 @@
 from app.models import User
+from app.identity import identity_cache
 
 def get_all_users():
     return User.query.all()
@@ -17,6 +18,7 @@ def create_user(name, email, role, password):
     )
     db.session.add(user)
     db.session.commit()
+    identity_cache.invalidate(user.id)
     return user
 
 def update_user(user_id, name, email, role):
@@ -27,4 +29,377 @@ def update_user(user_id, name, email, role):
         user.email = email
         user.role = role
         db.session.commit()
+        identity_cache.invalidate(user.id)
     return user
+
+
+# Страниц SQLite за один шаг резервного копирования. Между шагами
+# блокировка базы снимается, и проверки продолжают писать в неё.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01
+
+
+def _sqlite_path():
+    from app import db
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        raise ValueError('Операция поддерживается только для файловой базы SQLite')
+    return url.database
+
+
+def backup_database(job, backup_dir):
+    import os
+    import sqlite3
+    from datetime import datetime
+
+    os.makedirs(backup_dir, exist_ok=True)
+    target = os.path.join(
+        backup_dir, datetime.now().strftime('app-%Y%m%d-%H%M%S.db'))
+    tmp_target = target + '.part'
+
+    def progress(status, remaining, total):
+        job.update(progress=100 * (total - remaining) / total if total else 100)
+
+    job.update(stage='Копирование страниц')
+    source = sqlite3.connect(_sqlite_path())
+    dest = sqlite3.connect(tmp_target)
+    try:
+        source.backup(dest, pages=BACKUP_PAGES_PER_STEP,
+                      progress=progress, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        dest.close()
+        source.close()
+    os.replace(tmp_target, target)
+    job.update(message=f'Резервная копия: {os.path.basename(target)}')
+    return target
+
+
+def optimize_database(job, database_dir, index_dir):
+    import sqlite3
+    from app.core.corpus_index import get_corpus_index
+
+    conn = sqlite3.connect(_sqlite_path(), isolation_level=None)
+    try:
+        job.update(stage='ANALYZE', progress=5)
+        conn.execute('ANALYZE')
+        job.update(stage='REINDEX', progress=25)
+        conn.execute('REINDEX')
+        job.update(stage='VACUUM', progress=50)
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    job.update(stage='Сжатие индекса источников', progress=80)
+    index = get_corpus_index(database_dir, index_dir, refresh=False)
+    removed = index.compact()
+    job.update(message=f'Удалено устаревших записей индекса: {removed}')
+
+
+def update_sources(job, database_dir, index_dir):
+    from app.core.corpus_index import get_corpus_index
+
+    job.update(stage='Поиск новых и изменённых источников')
+    index = get_corpus_index(database_dir, index_dir, refresh=False)
+    stats = index.build(
+        workers=1,
+        progress=lambda done, total: job.update(
+            stage=f'Индексация {done}/{total}', progress=100 * done / total))
+    job.update(message=f"Проиндексировано: {stats['indexed']}, "
+                       f"удалено: {stats['removed']}, ошибок: {stats['errors']}")
+    return stats
+
+
+def list_sources(partition, query='', page=1, per_page=50):
+    """Документы индекса раздела базы, имя которых содержит query: (страница, всего)."""
+    from app.core.corpus_index import get_corpus_index
+    from app.partitions import partitions
+
+    index = get_corpus_index(*partitions.dirs(partition), refresh=False)
+    with index.lock:
+        names = sorted(name for name in index.entries
+                       if query.lower() in name.lower())
+        start = (page - 1) * per_page
+        items = [(name, index.entries[name]) for name in names[start:start + per_page]]
+    return items, len(names)
+
+
+def delete_sources(partition, names):
+    """
+    Удаление источников раздела базы с отметкой в журнале индекса.
+    Возвращает (удалённые имена, доля устаревших записей индекса).
+    """
+    from app.core.corpus_index import get_corpus_index
+    from app.partitions import partitions
+
+    index = get_corpus_index(*partitions.dirs(partition), refresh=False)
+    deleted = index.delete(names)
+    return deleted, index.garbage_ratio
+
+
+def compact_index(job, partition):
+    from app.core.corpus_index import get_corpus_index
+    from app.partitions import partitions
+
+    job.update(stage=f'Сжатие индекса источников ({partition})')
+    index = get_corpus_index(*partitions.dirs(partition), refresh=False)
+    removed = index.compact()
+    job.update(message=f'Удалено устаревших записей индекса: {removed}')
+    return removed
+
+
+def query_events(levels=None, email=None, action=None, since=None, until=None,
+                 before=None, limit=50):
+    """
+    События журнала аудита, новые первыми, не больше limit.
+    Отбор по времени [since, until), пользователю (email), действию и уровням;
+    before — курсор (время, номер) последнего события предыдущей страницы.
+    Возвращает (события, курсор следующей страницы или None).
+    """
+    from app import db
+    from app.models import AuditEvent
+
+    query = AuditEvent.query
+    if levels:
+        query = query.filter(AuditEvent.level.in_(levels))
+    if email:
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            # Иначе отбор user_id IS NULL вернул бы все анонимные события
+            return [], None
+        query = query.filter(AuditEvent.user_id == user.id)
+    if action:
+        query = query.filter(AuditEvent.action == action)
+    if since:
+        query = query.filter(AuditEvent.created >= since)
+    if until:
+        query = query.filter(AuditEvent.created < until)
+    if before:
+        created, event_id = before
+        query = query.filter(db.or_(
+            AuditEvent.created < created,
+            db.and_(AuditEvent.created == created, AuditEvent.id < event_id)))
+    events = query.order_by(AuditEvent.created.desc(), AuditEvent.id.desc()) \
+        .limit(limit + 1).all()
+    cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        cursor = (events[-1].created, events[-1].id)
+    return events, cursor
+
+
+# Проверок, пересчитываемых между фиксациями транзакции
+RESCORE_BATCH = 50
+
+
+def rescore_reports(job, database_dir, index_dir):
+    """
+    Пересчёт оригинальности прежних проверок с учётом новых источников.
+    Каждый документ сравнивается только с источниками, добавленными в индекс
+    после версии, с которой он проверялся (PlagiarismCheck.corpus_version),
+    поэтому пересчёт намного дешевле повторной полной проверки. Оценка
+    может только вырасти: отчёт обновляется, если найден более близкий источник.
+    Загруженные работы (SourceDocument), попавшие в базу, участвуют, только
+    если загружены раньше проверяемой: работа, списанная позже, не должна
+    снижать оценку оригинала.
+    """
+    import os
+    import numpy as np
+    from app import db
+    from app.models import PlagiarismCheck, ProcessedText, SourceDocument
+    from app.core.cascade import CascadeScorer, corpus_features
+    from app.core.corpus_index import get_corpus_index
+    from app.core.text_preprocessor import TextPreprocessor
+    from app.settings import get_cascade_settings
+    from app.statistics import record_report
+
+    job.update(stage='Обновление индекса источников')
+    index = get_corpus_index(database_dir, index_dir, refresh=True)
+    features = corpus_features(index)
+    scorer = CascadeScorer(get_cascade_settings())
+    # Время первой загрузки работы с тем же именем, что у файла базы;
+    # у прочих источников (не загруженных работ) — минус бесконечность
+    uploads = dict(db.session.query(SourceDocument.filename,
+                                    db.func.min(SourceDocument.upload_date))
+                   .group_by(SourceDocument.filename))
+    uploaded_at = np.array([uploads[name].timestamp() if uploads.get(name) else -np.inf
+                            for name in features.names], dtype=np.float64)
+
+    # Проверки только по разделам без общей базы не пересчитываются:
+    # у них нет версии общей базы (corpus_version)
+    checks = PlagiarismCheck.query.join(ProcessedText).filter(
+        ProcessedText.status == 'completed',
+        db.or_(db.and_(PlagiarismCheck.corpus_version.is_(None),
+                       PlagiarismCheck.partitions.is_(None)),
+               PlagiarismCheck.corpus_version < features.version)).all()
+    updated = 0
+    for done, check in enumerate(checks, 1):
+        processed = check.processed_text
+        since = check.corpus_version or 0
+        document = processed.document
+        # Собственный файл документа попадает в базу после проверки
+        own = document.filename
+        older = uploaded_at < document.upload_date.timestamp() \
+            if document.upload_date else np.isinf(uploaded_at)
+        candidates = np.array([i for i in np.flatnonzero((features.versions > since) & older)
+                               if features.names[i] != own], dtype=np.int64)
+        if len(candidates) and processed.extracted_text:
+            query = TextPreprocessor.preprocess_text(
+                processed.extracted_text,
+                remove_stop=index.remove_stopwords,
+                lemmatize=index.lemmatize)
+            result = scorer.score(features, query, candidates=candidates)
+            best = check.best_similarity
+            if best is None:
+                best = 1 - (check.uniqueness_percentage or 100.0) / 100
+            if result.best_path and result.similarity > best:
+                check.best_similarity = result.similarity
+                check.best_source = os.path.basename(result.best_path)
+                check.uniqueness_percentage = round(
+                    max(0.0, min(100.0, (1 - result.similarity) * 100)), 2)
+                report = check.report
+                if report is not None:
+                    previous = report.uniqueness_percentage
+                    report.uniqueness_percentage = check.uniqueness_percentage
+                    record_report(report, previous)
+                updated += 1
+        check.corpus_version = features.version
+        if done % RESCORE_BATCH == 0 or done == len(checks):
+            db.session.commit()
+            job.update(stage=f'Пересчёт {done}/{len(checks)}',
+                       progress=100 * done / len(checks))
+    job.update(message=f'Пересчитано проверок: {len(checks)}, '
+                       f'изменено отчётов: {updated}')
+    return {'checked': len(checks), 'updated': updated}
+
+
+def load_partition(job, name):
+    """Загрузка индекса раздела базы в память процесса (с обновлением по файлам)."""
+    from app.partitions import partitions
+
+    job.update(stage=f'Загрузка раздела {name}')
+    index = partitions.load(name)
+    job.update(message=f'Раздел {name}: документов {len(index.entries)}')
+    return len(index.entries)
+
+
+# Пользователей в одной транзакции массового импорта
+IMPORT_BATCH_SIZE = 500
+IMPORT_COLUMNS = ('name', 'email', 'role', 'password')
+# Ошибок, показываемых на странице импорта (полный список — в CSV)
+IMPORT_ERRORS_SHOWN = 200
+
+
+def parse_users_csv(data: bytes):
+    """
+    Строки CSV для импорта пользователей: пары (номер строки файла, поля).
+    Разделитель — запятая или точка с запятой, кодировка — UTF-8 или
+    однобайтовая кириллическая (выгрузка из Excel). ValueError, если
+    нет нужных столбцов.
+    """
+    import csv
+    import io
+    from app.core.plagiarism_check import detect_legacy_encoding
+
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = data.decode(detect_legacy_encoding(data), 'ignore')
+    first_line = text.split('\n', 1)[0]
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    reader = csv.DictReader(io.StringIO(text, newline=''), delimiter=delimiter)
+    header = [column.strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in IMPORT_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f'Нет столбцов: {", ".join(missing)}')
+    reader.fieldnames = header
+    return [(reader.line_num, {column: (row.get(column) or '').strip()
+                               for column in IMPORT_COLUMNS})
+            for row in reader if any((value or '').strip() for value in row.values()
+                                     if isinstance(value, str))]
+
+
+def import_users(job, rows, workers=None, batch_size=IMPORT_BATCH_SIZE, user_id=None):
+    """
+    Массовое создание пользователей из строк parse_users_csv.
+    Занятые email проверяются одним запросом, пароли хешируются в пуле
+    процессов, пользователи вставляются пачками по batch_size в отдельных
+    транзакциях. Строки с ошибками пропускаются и попадают в отчёт.
+    """
+    import multiprocessing
+    import os
+    import re
+    from concurrent.futures import ProcessPoolExecutor
+    from sqlalchemy.exc import IntegrityError
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.audit import audit
+    from app.models import UserRole
+
+    email_pattern = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+    errors = []
+    job.update(stage='Проверка строк', progress=0)
+    existing = {email.lower() for email, in db.session.query(User.email)}
+    valid = []
+    for line, row in rows:
+        email = row['email']
+        if not all(row[column] for column in IMPORT_COLUMNS):
+            errors.append((line, email, 'Заполнены не все поля'))
+        elif not email_pattern.match(email) or len(email) > 120:
+            errors.append((line, email, 'Неверный email'))
+        elif row['role'] not in UserRole:
+            errors.append((line, email, f'Неизвестная роль: {row["role"]}'))
+        elif len(row['name']) > 100:
+            errors.append((line, email, 'Слишком длинное имя'))
+        elif email.lower() in existing:
+            errors.append((line, email, 'Email уже используется'))
+        else:
+            existing.add(email.lower())
+            valid.append((line, row))
+
+    job.update(stage='Хеширование паролей', progress=5)
+    passwords = [row['password'] for _, row in valid]
+    hashes = []
+    if valid:
+        workers = workers or os.cpu_count() or 1
+        chunk = max(1, min(100, len(passwords) // (workers * 4)))
+        # Не fork: процесс веб-сервера многопоточный (в том числе поток
+        # журнала аудита), и копия чужой захваченной блокировки зависнет
+        method = 'forkserver' if 'forkserver' in \
+            multiprocessing.get_all_start_methods() else 'spawn'
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context(method)) as pool:
+            for password_hash in pool.map(generate_password_hash, passwords,
+                                          chunksize=chunk):
+                hashes.append(password_hash)
+                if len(hashes) % chunk == 0:
+                    job.update(progress=5 + 75 * len(hashes) / len(passwords))
+
+    job.update(stage='Создание пользователей', progress=80)
+    created = 0
+    for start in range(0, len(valid), batch_size):
+        batch = [dict(name=row['name'], email=row['email'], role=row['role'],
+                      password_hash=password_hash)
+                 for (_, row), password_hash in zip(valid[start:start + batch_size],
+                                                    hashes[start:start + batch_size])]
+        try:
+            db.session.execute(db.insert(User), batch)
+            db.session.commit()
+            created += len(batch)
+        except IntegrityError:
+            # Кто-то создал пользователя с тем же email во время импорта:
+            # пачка вставляется построчно, чтобы найти такие строки
+            db.session.rollback()
+            for (line, row), values in zip(valid[start:start + batch_size], batch):
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(db.insert(User), [values])
+                    created += 1
+                except IntegrityError:
+                    errors.append((line, row['email'], 'Email уже используется'))
+            db.session.commit()
+        job.update(progress=80 + 20 * min(len(valid), start + batch_size) / len(valid))
+
+    errors.sort()
+    job.update(message=f'Создано пользователей: {created}, ошибок: {len(errors)}')
+    audit.record('users_imported', job.message, user_id=user_id)
+    return {'created': created, 'errors': errors}
@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+# Приоритеты проверок: меньшее значение обслуживается раньше
+PRIORITY_TEACHER = 0
+PRIORITY_STUDENT = 1
+
+
+class AdmissionRejected(Exception):
+    """Проверка не принята: очередь заполнена или ожидание истекло."""
+
+
+class AdmissionController:
+    """
+    Контроль допуска проверок: не более max_concurrent одновременно,
+    остальные ждут в очереди по приоритету (при равном — по порядку).
+    Если очередь заполнена, проверка сразу отклоняется.
+    """
+
+    REJECTED_MESSAGE = 'Сервер перегружен, попробуйте проверить документ позже'
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 32,
+                 timeout: float = 60.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+
+    def init_app(self, app) -> None:
+        self.max_concurrent = app.config['MAX_CONCURRENT_CHECKS']
+        self.max_queue = app.config['MAX_CHECK_QUEUE']
+        self.timeout = app.config['CHECK_QUEUE_TIMEOUT']
+
+    def ensure_capacity(self) -> None:
+        """
+        Отказ сразу, если новая проверка не поместится в очередь.
+        Для проверок, которые ставятся фоновой задачей.
+        """
+        with self._cond:
+            if (self.running >= self.max_concurrent
+                    and len(self._waiting) >= self.max_queue):
+                self.rejected += 1
+                raise AdmissionRejected(self.REJECTED_MESSAGE)
+
+    @contextmanager
+    def admit(self, priority: int = PRIORITY_STUDENT):
+        """Занять место для проверки на время блока with."""
+        self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, priority: int) -> None:
+        started = time.monotonic()
+        with self._cond:
+            if self.running < self.max_concurrent and not self._waiting:
+                self.running += 1
+                self.admitted += 1
+                return
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(self.REJECTED_MESSAGE)
+
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            self.max_depth = max(self.max_depth, len(self._waiting))
+            deadline = started + self.timeout
+            while not (self.running < self.max_concurrent
+                       and self._waiting[0] == ticket):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.timed_out += 1
+                    self._cond.notify_all()
+                    raise AdmissionRejected(
+                        'Время ожидания в очереди истекло, попробуйте позже')
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self.running += 1
+            self.admitted += 1
+            self.wait_total += time.monotonic() - started
+            # Следующий в очереди может пройти, если есть свободные места
+            self._cond.notify_all()
+
+    def _release(self) -> None:
+        with self._cond:
+            self.running -= 1
+            self._cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                'running': self.running,
+                'max_concurrent': self.max_concurrent,
+                'queued': len(self._waiting),
+                'max_queue': self.max_queue,
+                'max_depth': self.max_depth,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_wait': self.wait_total / self.admitted if self.admitted else 0.0,
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from typing import Optional
+from config import ARTIFACT_FOLDER
+
+
+class ArtifactStore:
+    """
+    Готовые файлы (например, PDF отчётов) на диске. Файл определяется
+    видом, ключом объекта и версией содержимого: при изменении объекта
+    меняется версия, и файл создаётся заново, а прежние версии удаляются.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def path(self, kind: str, key, version: str, suffix: str) -> str:
+        return os.path.join(self.folder, f'{kind}-{key}-{version}{suffix}')
+
+    def get(self, kind: str, key, version: str, suffix: str) -> Optional[str]:
+        """Путь к файлу этой версии или None, если его ещё нет."""
+        path = self.path(kind, key, version, suffix)
+        return path if os.path.exists(path) else None
+
+    def put(self, kind: str, key, version: str, suffix: str, data: bytes) -> str:
+        """Атомарная запись файла: читатели не увидят недописанный файл."""
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.path(kind, key, version, suffix)
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.discard(kind, key, keep=path)
+        return path
+
+    def discard(self, kind: str, key, keep: str = None) -> None:
+        """Удаление файлов объекта (кроме keep)."""
+        prefix = f'{kind}-{key}-'
+        if not os.path.isdir(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.startswith(prefix) and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+artifacts = ArtifactStore(ARTIFACT_FOLDER)
@@ -0,0 +1,150 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from flask import has_request_context, request
+
+# Уровни событий; предупреждения и ошибки показываются в списке оповещений
+LEVEL_INFO = 'info'
+LEVEL_WARNING = 'warning'
+LEVEL_ERROR = 'error'
+ALERT_LEVELS = (LEVEL_WARNING, LEVEL_ERROR)
+
+ACTION_TITLES = {
+    'login': 'Вход',
+    'login_failed': 'Неудачный вход',
+    'logout': 'Выход',
+    'upload': 'Загрузка документа',
+    'check': 'Проверка документа',
+    'check_failed': 'Ошибка проверки',
+    'check_rejected': 'Проверка отклонена',
+    'low_uniqueness': 'Низкая уникальность',
+    'grade': 'Оценка работы',
+    'user_created': 'Создан пользователь',
+    'user_updated': 'Изменён пользователь',
+    'users_imported': 'Импорт пользователей',
+    'sources_deleted': 'Удалены источники',
+}
+
+
+class AuditLog:
+    """
+    Журнал аудита и оповещений. События копятся в памяти и записываются
+    в таблицу audit_events пачками фоновым потоком: раз в flush_interval с
+    или сразу, когда набралось batch_size событий. Запрос не ждёт записи.
+    Если база недоступна дольше, чем помещается в буфер (buffer_limit),
+    самые старые события отбрасываются и учитываются в dropped.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, batch_size: int = 500,
+                 buffer_limit: int = 100000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer_limit = buffer_limit
+        self.app = None
+        self.written = 0
+        self.dropped = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        # Процесс, в котором запущен поток записи (после fork — заново)
+        self._pid = os.getpid()
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.flush_interval = app.config['AUDIT_FLUSH_INTERVAL']
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self.buffer_limit = app.config['AUDIT_BUFFER_LIMIT']
+
+    def record(self, action: str, message: str = '', user_id: int = None,
+               level: str = LEVEL_INFO) -> None:
+        """Событие в буфер; user_id по умолчанию — текущий пользователь."""
+        if user_id is None and has_request_context():
+            from flask_login import current_user
+            if current_user.is_authenticated:
+                user_id = current_user.id
+        event = {
+            'created': datetime.now(timezone.utc).replace(tzinfo=None),
+            'user_id': user_id,
+            'action': action,
+            'level': level,
+            'message': message[:500],
+            'address': request.remote_addr if has_request_context() else None,
+        }
+        if self._pid != os.getpid():
+            self._reset()
+        with self._cond:
+            if len(self._buffer) >= self.buffer_limit:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(event)
+            if self._thread is None and self.app is not None:
+                self._thread = threading.Thread(
+                    target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def alert(self, action: str, message: str = '', user_id: int = None,
+              level: str = LEVEL_WARNING) -> None:
+        self.record(action, message, user_id, level)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # События остаются в буфере до следующей попытки
+                self.app.logger.exception('Не удалось записать журнал аудита')
+                time.sleep(self.flush_interval)
+
+    def flush(self) -> int:
+        """Запись накопленных событий; возвращает число записанных."""
+        from app import db
+        from app.models import AuditEvent
+
+        if self.app is None:
+            return 0
+        with self._flush_lock:
+            with self._cond:
+                events = list(self._buffer)
+                self._buffer.clear()
+            if not events:
+                return 0
+            try:
+                # Отдельное соединение: сессия потока запроса не затрагивается
+                with self.app.app_context(), db.engine.begin() as connection:
+                    for start in range(0, len(events), self.batch_size):
+                        connection.execute(db.insert(AuditEvent.__table__),
+                                           events[start:start + self.batch_size])
+            except Exception:
+                # Возврат в начало буфера, чтобы повторить запись позже
+                with self._cond:
+                    self._buffer.extendleft(reversed(events))
+                    while len(self._buffer) > self.buffer_limit:
+                        self._buffer.popleft()
+                        self.dropped += 1
+                raise
+            self.written += len(events)
+            return len(events)
+
+
+audit = AuditLog()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        audit.flush()
+    except Exception:
+        pass
+
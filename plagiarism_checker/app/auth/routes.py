@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from app.models import User
 from app.auth import bp
+from app.audit import audit, LEVEL_WARNING
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -15,7 +16,10 @@ def login():
         user = User.query.filter_by(email=email).first()
         if user and check_password_hash(user.password_hash, password):
             login_user(user)
+            audit.record('login', user_id=user.id)
             return redirect_by_role(user.role)
+        audit.record('login_failed', email, user_id=user.id if user else None,
+                     level=LEVEL_WARNING)
         flash('Неверные учетные данные')
     return render_template('login.html')
 
@@ -30,5 +34,7 @@ def redirect_by_role(role):
 
 @bp.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        audit.record('logout')
     logout_user()
     return redirect(url_for('auth.login'))
@@ -0,0 +1,302 @@
+import json
+import subprocess
+import sys
+import time
+import click
+from flask.cli import AppGroup, with_appcontext
+from config import DB_FOLDER, INDEX_FOLDER
+
+corpus_cli = AppGroup('corpus', help='Обслуживание индекса базы источников.')
+
+
+@corpus_cli.command('build')
+@click.option('--rebuild', is_flag=True, help='Собрать индекс заново.')
+@click.option('--workers', type=int, default=None,
+              help='Число процессов (по умолчанию — по числу ядер).')
+@click.option('--partition', default=None,
+              help='Раздел базы (по умолчанию — общая база DB_FOLDER).')
+def build_command(rebuild, workers, partition):
+    """Индексация документов из DB_FOLDER или раздела базы."""
+    from app.core.corpus_index import CorpusIndex, drop_cached_index
+    from app.partitions import partitions
+
+    database_dir, index_dir = DB_FOLDER, INDEX_FOLDER
+    if partition is not None:
+        if partition not in partitions.names():
+            raise click.ClickException(f'Раздел не найден: {partition}')
+        database_dir, index_dir = partitions.dirs(partition)
+    started = time.perf_counter()
+    index = CorpusIndex.load(database_dir, index_dir)
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            click.echo(f'  {done}/{total}')
+
+    stats = index.build(workers=workers, rebuild=rebuild, progress=progress)
+    drop_cached_index(database_dir, index_dir)
+    click.echo(
+        f"Проиндексировано: {stats['indexed']}, удалено: {stats['removed']}, "
+        f"ошибок: {stats['errors']}, документов в индексе: {len(index.entries)} "
+        f"({time.perf_counter() - started:.1f} с)")
+
+
+@corpus_cli.command('partitions')
+def partitions_command():
+    """Разделы базы и число файлов в каждом."""
+    from app.partitions import partitions
+
+    for partition in partitions.status():
+        click.echo(f"{partition['name']}: файлов {partition['files']}")
+
+
+@corpus_cli.command('verify')
+def verify_command():
+    """Сверка индекса с файлами на диске."""
+    from app.core.corpus_index import CorpusIndex
+
+    index = CorpusIndex.load(DB_FOLDER, INDEX_FOLDER)
+    diff = index.verify()
+    labels = {'new': 'Не проиндексированы', 'changed': 'Изменены',
+              'missing': 'Отсутствуют на диске'}
+    for key, label in labels.items():
+        click.echo(f'{label}: {len(diff[key])}')
+        for name in diff[key][:20]:
+            click.echo(f'  {name}')
+    if any(diff.values()):
+        raise SystemExit(1)
+    click.echo('Индекс соответствует файлам на диске')
+
+
+@corpus_cli.command('compact')
+def compact_command():
+    """Перезапись индекса без устаревших записей."""
+    from app.core.corpus_index import CorpusIndex
+
+    index = CorpusIndex.load(DB_FOLDER, INDEX_FOLDER)
+    removed = index.compact()
+    click.echo(f'Удалено устаревших записей: {removed}, '
+               f'документов в индексе: {len(index.entries)}')
+
+
+@corpus_cli.command('delete')
+@click.argument('names', nargs=-1, required=True)
+@click.option('--partition', default=None,
+              help='Раздел базы (по умолчанию — общая база DB_FOLDER).')
+def delete_command(names, partition):
+    """Удаление источников из базы (или раздела) и индекса."""
+    from flask import current_app
+    from app.core.corpus_index import CorpusIndex
+    from app.partitions import partitions
+
+    database_dir, index_dir = DB_FOLDER, INDEX_FOLDER
+    if partition is not None:
+        if partition not in partitions.names():
+            raise click.ClickException(f'Раздел не найден: {partition}')
+        database_dir, index_dir = partitions.dirs(partition)
+    index = CorpusIndex.load(database_dir, index_dir)
+    deleted = index.delete(list(names))
+    click.echo(f'Удалено источников: {len(deleted)}')
+    for name in sorted(set(names) - set(deleted)):
+        click.echo(f'  нет в индексе: {name}')
+    if index.garbage_ratio > current_app.config['CORPUS_COMPACT_RATIO']:
+        click.echo(f'Удалено устаревших записей: {index.compact()}')
+
+
+@corpus_cli.command('warm')
+def warm_command():
+    """Прогрев кэшей: дочитать индекс и доиндексировать новые файлы."""
+    from app.core.corpus_index import warm_corpus_cache
+
+    started = time.perf_counter()
+    index = warm_corpus_cache(DB_FOLDER, INDEX_FOLDER)
+    click.echo(f'Документов в индексе: {len(index.entries)} '
+               f'({time.perf_counter() - started:.1f} с)')
+
+
+@corpus_cli.command('lsa-build')
+@click.option('--components', type=int, default=None,
+              help='Размерность эмбеддингов (по умолчанию 256).')
+def lsa_build_command(components):
+    """Построение модели LSA по текущему индексу."""
+    from pathlib import Path
+    from app.core.cascade import corpus_features
+    from app.core.corpus_index import get_corpus_index
+    from app.core.lsa import DEFAULT_COMPONENTS, LSA_FILENAME, LsaModel
+
+    started = time.perf_counter()
+    features = corpus_features(get_corpus_index(DB_FOLDER, INDEX_FOLDER))
+    try:
+        model = LsaModel.fit(features, components or DEFAULT_COMPONENTS)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    model.save(Path(INDEX_FOLDER) / LSA_FILENAME)
+    click.echo(f'Модель LSA: документов {len(model.names)}, '
+               f'столбцов {len(model.column_tokens)}, '
+               f'размерность {model.components.shape[0]}, '
+               f'эмбеддинги {model.embeddings.nbytes / 2 ** 20:.1f} МБ '
+               f'({time.perf_counter() - started:.1f} с)')
+
+
+@corpus_cli.command('lsa-recall')
+@click.option('--queries', type=int, default=100, help='Число запросов.')
+@click.option('--k', type=int, default=10, help='Размер списка лучших.')
+def lsa_recall_command(queries, k):
+    """Сравнение LSA с точной мерой TF-IDF (recall@k)."""
+    from app.core.cascade import corpus_features
+    from app.core.corpus_index import get_corpus_index
+    from app.core.lsa import lsa_recall
+
+    features = corpus_features(get_corpus_index(DB_FOLDER, INDEX_FOLDER))
+    lsa = features.lsa()
+    if lsa is None:
+        raise click.ClickException('Модель LSA не построена: flask corpus lsa-build')
+    stats = lsa_recall(features, lsa, queries, k)
+    click.echo(f"Запросов: {stats['queries']}, recall@{k}: {stats['recall']:.3f}, "
+               f"TF-IDF {stats['exact_ms']:.1f} мс, LSA {stats['lsa_ms']:.1f} мс "
+               f"на запрос (добавлено без переобучения: {lsa.folded_in})")
+
+
+@corpus_cli.command('jaccard-check')
+@click.option('--queries', type=int, default=100, help='Число запросов.')
+@click.option('--threshold', type=float, default=0.5, help='Порог меры Жаккара.')
+def jaccard_check_command(queries, threshold):
+    """Сравнение поиска по префиксному индексу с полным перебором."""
+    import random
+    from app.core.cascade import corpus_features
+    from app.core.corpus_index import get_corpus_index
+    from app.core.set_similarity import jaccard
+
+    features = corpus_features(get_corpus_index(DB_FOLDER, INDEX_FOLDER))
+    if not len(features):
+        raise click.ClickException('База источников пуста')
+    documents = [set(features.tokens(i).tolist()) for i in range(len(features))]
+    # Тот же индекс, что у этапа jaccard каскада
+    index = features.jaccard()
+    rng = random.Random(0)
+    mismatches = verified = indexed_time = brute_time = 0
+    for _ in range(queries):
+        query = rng.choice(documents)
+        stats = {}
+        started = time.perf_counter()
+        found = index.search(query, threshold, stats)
+        indexed_time += time.perf_counter() - started
+        started = time.perf_counter()
+        expected = [(i, s) for i, s in ((i, jaccard(query, d)) for i, d in enumerate(documents))
+                    if s >= threshold and s > 0]
+        brute_time += time.perf_counter() - started
+        expected.sort(key=lambda match: (-match[1], match[0]))
+        mismatches += found != expected
+        verified += stats['verified']
+    click.echo(f'Запросов: {queries}, расхождений с перебором: {mismatches}, '
+               f'точных проверок: {100 * verified / (queries * len(documents)):.2f}% базы, '
+               f'индекс {1000 * indexed_time / queries:.1f} мс, '
+               f'перебор {1000 * brute_time / queries:.1f} мс на запрос')
+    if mismatches:
+        raise SystemExit(1)
+
+
+@corpus_cli.command('rescore')
+def rescore_command():
+    """Пересчёт прежних проверок только по новым источникам."""
+    from app.admin.services import rescore_reports
+    from app.jobs import Job, JobRegistry
+
+    started = time.perf_counter()
+    job = Job(JobRegistry(), 'rescore_reports', 'Пересчёт отчётов')
+    rescore_reports(job, DB_FOLDER, INDEX_FOLDER)
+    click.echo(f'{job.message} ({time.perf_counter() - started:.1f} с)')
+
+
+@click.command('init-db')
+@click.option('--demo-users', is_flag=True, help='Создать демонстрационных пользователей.')
+@with_appcontext
+def init_db_command(demo_users):
+    """Создание таблиц и добавление новых столбцов в существующие таблицы."""
+    from app.schema import init_schema
+
+    added = init_schema()
+    if demo_users:
+        from app.auth.utils import create_demo_users
+        create_demo_users()
+    if added:
+        click.echo(f"Добавлены столбцы: {', '.join(added)}")
+    click.echo('Схема базы данных обновлена')
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Пересчёт сводки отчётов (для отчётов, созданных до её появления)."""
+    from app.statistics import rebuild_report_stats
+
+    click.echo(f'Учтено отчётов: {rebuild_report_stats()}')
+
+
+@click.command('import-users')
+@click.argument('csv_file', type=click.File('rb'))
+@click.option('--workers', type=int, default=None,
+              help='Процессов для хеширования паролей (по умолчанию USER_IMPORT_WORKERS).')
+@with_appcontext
+def import_users_command(csv_file, workers):
+    """Массовый импорт пользователей из CSV (name, email, role, password)."""
+    from flask import current_app
+    from app.admin.services import parse_users_csv, import_users
+    from app.jobs import Job, JobRegistry
+
+    try:
+        rows = parse_users_csv(csv_file.read())
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    started = time.perf_counter()
+    job = Job(JobRegistry(), 'import_users', 'Импорт пользователей')
+    result = import_users(job, rows, workers or current_app.config['USER_IMPORT_WORKERS'])
+    for line, email, error in result['errors']:
+        click.echo(f'Строка {line} ({email}): {error}', err=True)
+    click.echo(f'{job.message} ({time.perf_counter() - started:.1f} с)')
+
+
+# Модули, которые не должны загружаться при создании приложения
+HEAVY_MODULES = ('numpy', 'scipy', 'sklearn', 'PyPDF2', 'docx')
+
+_STARTUP_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'heavy': [name for name in sys.argv[1:] if name in sys.modules],
+}))
+'''
+
+
+@click.command('startup-check')
+@click.option('--budget', type=float, default=1.0, show_default=True,
+              help='Допустимое время импорта и create_app(), с.')
+def startup_check_command(budget):
+    """
+    Проверка времени запуска: create_app() в чистом процессе укладывается
+    в бюджет и не загружает тяжёлые библиотеки. Код возврата 1 при нарушении.
+    """
+    from pathlib import Path
+
+    root = Path(__file__).resolve().parents[1]
+    probe = subprocess.run(
+        [sys.executable, '-c', _STARTUP_PROBE, *HEAVY_MODULES],
+        cwd=root, capture_output=True, text=True)
+    if probe.returncode != 0:
+        raise click.ClickException(probe.stderr.strip())
+    result = json.loads(probe.stdout.strip().splitlines()[-1])
+    click.echo(f"create_app(): {result['seconds']:.3f} с (бюджет {budget:.3f} с)")
+    if result['heavy']:
+        click.echo(f"Загружены при запуске: {', '.join(result['heavy'])}")
+    if result['heavy'] or result['seconds'] > budget:
+        raise SystemExit(1)
+
+
+def register_cli(app):
+    app.cli.add_command(corpus_cli)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(startup_check_command)
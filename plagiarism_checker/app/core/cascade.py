@@ -0,0 +1,313 @@
+import logging
+import threading
+import weakref
+import zlib
+from typing import List, Optional, Sequence
+import numpy as np
+from app.core.hashing_vectorizer import hash_features, tfidf_cosine
+from app.core.stages import STAGE_TITLES, DEFAULT_CASCADE, validate_cascade
+
+logger = logging.getLogger(__name__)
+
+MINHASH_PERMUTATIONS = 64
+MINHASH_PRIME = (1 << 31) - 1
+ALIGNMENT_SHINGLE = 5
+
+_rng = np.random.RandomState(20240601)
+_MINHASH_A = _rng.randint(1, MINHASH_PRIME, MINHASH_PERMUTATIONS).astype(np.int64)
+_MINHASH_B = _rng.randint(0, MINHASH_PRIME, MINHASH_PERMUTATIONS).astype(np.int64)
+
+
+def token_hashes(tokens: Sequence[str]) -> np.ndarray:
+    """Стабильные между процессами хэши уникальных токенов."""
+    return np.fromiter((zlib.crc32(token.encode('utf-8')) for token in set(tokens)),
+                       dtype=np.int64)
+
+
+def minhash_signature(tokens: Sequence[str]) -> np.ndarray:
+    """Сигнатура MinHash множества токенов."""
+    signature = np.full(MINHASH_PERMUTATIONS, MINHASH_PRIME, dtype=np.uint32)
+    hashes = token_hashes(tokens) % MINHASH_PRIME
+    # Блоками, чтобы матрица перестановок не занимала много памяти
+    for start in range(0, len(hashes), 4096):
+        block = hashes[start:start + 4096]
+        permuted = (_MINHASH_A[:, None] * block[None, :] + _MINHASH_B[:, None]) \
+            % MINHASH_PRIME
+        signature = np.minimum(signature, permuted.min(axis=1).astype(np.uint32))
+    return signature
+
+
+class CorpusFeatures:
+    """
+    Признаки документов базы, общие для всех проверок
+    до следующего изменения индекса.
+    Токены документов не копируются: берутся строки хранилища индекса.
+    """
+
+    def __init__(self, index):
+        documents = index.documents()
+        self.index = index
+        self.names = [name for name, _ in documents]
+        self.rows = np.array([entry['row'] for _, entry in documents], dtype=np.int64)
+        self.n_unique = np.array([entry['n_unique'] for _, entry in documents],
+                                 dtype=np.int64)
+        # Версии документов в индексе (см. CorpusIndex._put_records)
+        self.versions = np.array([entry.get('version', 0) for _, entry in documents],
+                                 dtype=np.int64)
+        self.version = index.version
+        self.signatures = np.vstack([entry['minhash'] for _, entry in documents]) \
+            if documents else np.empty((0, MINHASH_PERMUTATIONS), np.uint32)
+        self.store = index.store
+        self.vocabulary = index.vocabulary
+        self.frequencies = index.frequencies.snapshot()
+        self._lsa = None
+        self._lsa_model = None
+        self._jaccard = None
+        self._build_lock = threading.Lock()
+        self._postings = None
+
+    def lsa(self):
+        """Модель LSA, привязанная к этим признакам, или None."""
+        from app.core.lsa import load_lsa_model
+        model = load_lsa_model(self.index.index_path.parent)
+        if model is None:
+            return None
+        with _features_lock:
+            if self._lsa_model is not model:
+                self._lsa = model.bind(self)
+                self._lsa_model = model
+            return self._lsa
+
+    def jaccard(self):
+        """
+        Префиксный индекс множеств токенов для точной меры Жаккара
+        (app.core.set_similarity); строится один раз для этих признаков,
+        то есть заново только после изменения индекса базы.
+        """
+        from app.core.set_similarity import JaccardIndex
+        with self._build_lock:
+            if self._jaccard is None:
+                self._jaccard = JaccardIndex(
+                    self.tokens(i).tolist() for i in range(len(self)))
+            return self._jaccard
+
+    def postings(self):
+        """
+        Обратный индекс в виде массивов: документы токена t (без повторов) —
+        documents[offsets[t]:offsets[t + 1]]. Строится один раз для этих признаков.
+        """
+        with self._build_lock:
+            if self._postings is None:
+                rows = [np.unique(self.tokens(i)) for i in range(len(self))]
+                tokens = np.concatenate(rows) if rows else np.empty(0, np.int32)
+                documents = np.repeat(np.arange(len(rows), dtype=np.int32),
+                                      [len(row) for row in rows])
+                order = np.argsort(tokens, kind='stable')
+                counts = np.bincount(tokens, minlength=len(self.vocabulary))
+                offsets = np.concatenate(([0], np.cumsum(counts)))
+                self._postings = (documents[order], offsets)
+            return self._postings
+
+    def overlaps(self, ids: np.ndarray) -> np.ndarray:
+        """Число общих токенов (без повторов) запроса с каждым документом."""
+        documents, offsets = self.postings()
+        known = np.unique(ids[(ids >= 0) & (ids < len(offsets) - 1)])
+        if not len(known):
+            return np.zeros(len(self), dtype=np.int64)
+        matched = np.concatenate([documents[offsets[t]:offsets[t + 1]] for t in known])
+        return np.bincount(matched, minlength=len(self))
+
+    def __len__(self):
+        return len(self.names)
+
+    def path(self, i: int) -> str:
+        return self.index.path(self.names[i])
+
+    def tokens(self, i: int) -> np.ndarray:
+        return self.store.row(self.rows[i])
+
+
+_features_cache = weakref.WeakKeyDictionary()
+_features_lock = threading.Lock()
+
+
+def corpus_features(index) -> CorpusFeatures:
+    """Признаки базы для текущего состояния индекса (кэшируются)."""
+    with _features_lock:
+        cached = _features_cache.get(index)
+        if cached is not None and cached[0] == index.generation:
+            return cached[1]
+    with index.lock:
+        generation = index.generation
+        features = CorpusFeatures(index)
+    with _features_lock:
+        _features_cache[index] = (generation, features)
+    return features
+
+
+class CascadeResult:
+    def __init__(self):
+        self.similarity = 0.0
+        self.best_path: Optional[str] = None
+        # (этап, кандидатов на входе, кандидатов на выходе)
+        self.stage_counts = []
+
+
+class CascadeScorer:
+    """
+    Многоэтапная оценка сходства: дешёвые фильтры отбирают кандидатов
+    для дорогих методов. Каждый этап передаёт дальше не более top_k
+    лучших документов со score не ниже min_score.
+    Итоговое сходство — максимум оценки последнего этапа.
+    Этап получает признаки базы, запрос, номера кандидатов и свой порог.
+    """
+
+    def __init__(self, stages: Optional[List[dict]] = None):
+        self.stages = validate_cascade(stages or DEFAULT_CASCADE)
+
+    def score(self, features: CorpusFeatures, query_text: str,
+              progress=None, candidates: Optional[np.ndarray] = None) -> CascadeResult:
+        """
+        Оценка запроса; progress(этап, процент) вызывается перед этапами.
+        candidates — номера документов, с которыми идёт сравнение (по умолчанию все).
+        """
+        result = CascadeResult()
+        tokens = query_text.split()
+        query = {
+            'tokens': tokens,
+            'ids': features.vocabulary.encode(tokens),
+            'n_unique': len(set(tokens)),
+            'minhash': minhash_signature(tokens),
+        }
+
+        if candidates is None:
+            candidates = np.arange(len(features))
+        scores = np.zeros(0)
+        for number, stage in enumerate(self.stages):
+            before = len(candidates)
+            if before == 0:
+                break
+            if progress is not None:
+                progress(STAGE_TITLES[stage['stage']],
+                         30 + 70 * number / len(self.stages))
+            stage_scores = getattr(self, '_stage_' + stage['stage'])(
+                features, query, candidates, stage['min_score'])
+            if stage_scores is None:
+                # Этап недоступен: кандидаты проходят без изменений
+                if len(scores) != before:
+                    scores = np.zeros(before)
+                result.stage_counts.append((stage['stage'], before, before))
+                continue
+            scores = stage_scores
+            keep = np.flatnonzero(scores >= stage['min_score'])
+            if len(keep) > stage['top_k']:
+                # Частичная сортировка: на больших базах полная дороже
+                top = np.argpartition(-scores[keep], stage['top_k'])[:stage['top_k']]
+                keep = keep[top[np.argsort(-scores[keep][top], kind='stable')]]
+            candidates, scores = candidates[keep], scores[keep]
+            result.stage_counts.append((stage['stage'], before, len(candidates)))
+
+        logger.info('Каскад: %s', ', '.join(
+            f'{name} {before}->{after}' for name, before, after in result.stage_counts))
+
+        if len(candidates):
+            best = int(np.argmax(scores))
+            result.similarity = float(max(0.0, min(1.0, scores[best])))
+            result.best_path = features.path(candidates[best])
+        return result
+
+    @staticmethod
+    def _stage_length(features, query, candidates, min_score) -> np.ndarray:
+        """Верхняя граница меры Жаккара по размерам словарей."""
+        sizes = features.n_unique[candidates]
+        q = query['n_unique']
+        bigger = np.maximum(sizes, q)
+        return np.where(bigger > 0, np.minimum(sizes, q) / np.maximum(bigger, 1), 0.0)
+
+    @staticmethod
+    def _stage_minhash(features, query, candidates, min_score) -> np.ndarray:
+        """Оценка меры Жаккара по совпадающим позициям сигнатур MinHash."""
+        if query['n_unique'] == 0:
+            return np.zeros(len(candidates))
+        matches = features.signatures[candidates] == query['minhash'][None, :]
+        scores = matches.mean(axis=1)
+        return np.where(features.n_unique[candidates] > 0, scores, 0.0)
+
+    @staticmethod
+    def _stage_containment(features, query, candidates, min_score) -> np.ndarray:
+        """
+        Доля слов запроса, которые есть в источнике (|Q ∩ D| / |Q|). В отличие
+        от меры Жаккара не зависит от размера источника: фрагмент, взятый
+        из большого документа, получает высокую оценку.
+        """
+        if query['n_unique'] == 0:
+            return np.zeros(len(candidates))
+        return features.overlaps(query['ids'])[candidates] / query['n_unique']
+
+    @staticmethod
+    def _stage_jaccard(features, query, candidates, min_score) -> np.ndarray:
+        """
+        Точная мера Жаккара: поиск по префиксному индексу с порогом этапа;
+        документы ниже порога получают 0.
+        """
+        scores = np.zeros(len(features))
+        # Множество номеров: повторы токенов (в том числе неизвестных) не учитываются
+        tokens = set(query['ids'].tolist())
+        for doc, similarity in features.jaccard().search(tokens, min_score):
+            scores[doc] = similarity
+        return scores[candidates]
+
+    @staticmethod
+    def _stage_lsa(features, query, candidates, min_score) -> Optional[np.ndarray]:
+        """Косинус плотных эмбеддингов LSA; без модели этап пропускается."""
+        lsa = features.lsa()
+        if lsa is None:
+            logger.warning('Модель LSA не построена, этап пропущен')
+            return None
+        return lsa.scores(lsa.query_vector(query['ids']), candidates)
+
+    @staticmethod
+    def _stage_tfidf(features, query, candidates, min_score) -> np.ndarray:
+        """Косинусная мера TF-IDF по хэшированным признакам."""
+        if 'features' not in query:
+            query['features'] = hash_features(query['tokens'])
+        query_ids, query_counts = query['features']
+        return tfidf_cosine(query_ids, query_counts, features.frequencies,
+                            features.vocabulary.features, features.store.tokens,
+                            features.store.offsets, features.rows[candidates])
+
+    @staticmethod
+    def _stage_alignment(features, query, candidates, min_score) -> np.ndarray:
+        """Доля слов проверяемого текста, входящих в общие фрагменты."""
+        query_ids = query['ids'].tolist()
+        return np.array([
+            alignment_coverage(query_ids, features.tokens(i).tolist())
+            for i in candidates
+        ])
+
+
+def shared_passages(tokens: Sequence, other: Sequence,
+                    shingle: int = ALIGNMENT_SHINGLE) -> List[tuple]:
+    """
+    Общие фрагменты двух текстов: диапазоны [начало, конец) в tokens,
+    покрытые последовательностями из shingle слов, которые есть в other.
+    """
+    if len(tokens) < shingle or len(other) < shingle:
+        return []
+    other_shingles = {tuple(other[i:i + shingle])
+                      for i in range(len(other) - shingle + 1)}
+    passages = []
+    for i in range(len(tokens) - shingle + 1):
+        if tuple(tokens[i:i + shingle]) in other_shingles:
+            if passages and passages[-1][1] >= i:
+                passages[-1][1] = i + shingle
+            else:
+                passages.append([i, i + shingle])
+    return [tuple(p) for p in passages]
+
+
+def alignment_coverage(tokens: Sequence, other: Sequence) -> float:
+    if not tokens:
+        return 0.0
+    covered = sum(end - start for start, end in shared_passages(tokens, other))
+    return covered / len(tokens)
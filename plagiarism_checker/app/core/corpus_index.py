@@ -0,0 +1,489 @@
+import os
+import pickle
+import threading
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.cascade import minhash_signature
+from app.core.hashing_vectorizer import DocumentFrequencies
+from app.core.plagiarism_check import supported_extensions
+from app.core.text_preprocessor import TextPreprocessor
+from app.core.token_store import TokenStore, Vocabulary
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_FORMAT = 4
+INDEX_FILENAME = 'corpus.idx'
+
+
+def _index_file(file_path: str, remove_stopwords: bool,
+                lemmatize: bool) -> Tuple[str, dict]:
+    """
+    Извлечение и предобработка одного документа базы.
+    Выполняется в дочерних процессах при параллельной сборке.
+    Токены возвращаются строками: номера им присваивает словарь индекса.
+    Текст извлекается так же, как при проверке (app.core.extraction): PDF
+    и DOCX разбираются в изолированных процессах с ограничением памяти и времени.
+    """
+    from app.core.extraction import extract_text
+
+    stat = os.stat(file_path)
+    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+             'tokens': [], 'error': None}
+    try:
+        text = extract_text(file_path)
+        tokens = TextPreprocessor.preprocess_text(
+            text,
+            remove_stop=remove_stopwords,
+            lemmatize=lemmatize
+        ).split()
+        entry['tokens'] = tokens
+        entry['n_tokens'] = len(tokens)
+        entry['n_unique'] = len(set(tokens))
+        entry['minhash'] = minhash_signature(tokens)
+    except Exception as e:
+        entry['error'] = str(e)
+    return os.path.basename(file_path), entry
+
+
+class CorpusIndex:
+    """
+    Индекс предобработанных документов базы источников.
+
+    Хранится на диске как журнал записей: новые токены словаря ('vocab'),
+    новые и изменённые документы ('put') дописываются в конец файла,
+    удалённые отмечаются записью 'del'. Сжатие (compact) переписывает
+    журнал, оставляя только живые записи.
+
+    В памяти документы хранятся номерами токенов в TokenStore, исходный
+    текст не хранится и при необходимости читается из файла (raw_text).
+
+    Каждая запись 'put' получает версию (entry['version']): возрастающее
+    между процессами число, сохраняемое при сжатии. Версия индекса —
+    наибольшая версия документа; проверки запоминают её, чтобы позже
+    сравнить работу только с источниками, добавленными после проверки.
+    """
+
+    def __init__(self, database_dir: str, index_dir: str,
+                 remove_stopwords: bool = True,
+                 lemmatize: bool = True):
+        self.database_dir = Path(database_dir)
+        self.index_path = Path(index_dir) / INDEX_FILENAME
+        self.remove_stopwords = remove_stopwords
+        self.lemmatize = lemmatize
+        self.entries: Dict[str, dict] = {}
+        # Число записей 'put' и 'del' в журнале
+        self.records = 0
+        # Увеличивается при каждом изменении набора документов
+        self.generation = 0
+        # Наибольшая версия документа (см. _put_records)
+        self.version = 0
+        # Документные частоты хэшированных признаков для IDF
+        self.frequencies = DocumentFrequencies()
+        self.vocabulary = Vocabulary()
+        self.store = TokenStore()
+        self.lock = threading.RLock()
+        # Идентификатор файла журнала и позиция, до которой записи применены
+        self._file_id = None
+        self._offset = 0
+
+    def _new_header(self) -> tuple:
+        return ('header', INDEX_FORMAT, self.remove_stopwords, self.lemmatize,
+                uuid.uuid4().hex)
+
+    def _header_matches(self, header) -> bool:
+        return isinstance(header, tuple) and len(header) == 5 and \
+            header[:4] == self._new_header()[:4]
+
+    @classmethod
+    def load(cls, database_dir: str, index_dir: str, **kwargs) -> 'CorpusIndex':
+        """Загрузка индекса с диска. Несовместимый индекс игнорируется."""
+        index = cls(database_dir, index_dir, **kwargs)
+        with index._file_lock():
+            index.sync()
+        return index
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка журнала индекса."""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.index_path.with_suffix('.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def sync(self) -> None:
+        """
+        Применение записей, дописанных в журнал другими процессами.
+        Если журнал был переписан (compact, rebuild), он читается заново.
+        """
+        if not self.index_path.exists():
+            self._reset()
+            return
+
+        with open(self.index_path, 'rb') as f:
+            try:
+                header = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                header = None
+            if not self._header_matches(header):
+                warnings.warn(
+                    f"Индекс {self.index_path} несовместим и будет пересобран")
+                self.index_path.unlink()
+                self._reset()
+                return
+            if header[4] != self._file_id:
+                self._reset()
+                self._file_id = header[4]
+                self._offset = f.tell()
+
+            f.seek(self._offset)
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except pickle.UnpicklingError:
+                    # Оборванная последняя запись после сбоя при дописывании
+                    warnings.warn(
+                        f"Индекс {self.index_path} повреждён в конце файла")
+                    break
+                self._apply(record)
+                self._offset = f.tell()
+
+    def _reset(self) -> None:
+        self.entries = {}
+        self.records = 0
+        self.generation += 1
+        self.version = 0
+        self.frequencies = DocumentFrequencies()
+        self.vocabulary = Vocabulary()
+        self.store = TokenStore()
+        self._file_id = None
+        self._offset = 0
+
+    def _apply(self, record: tuple) -> None:
+        if record[0] == 'vocab':
+            self.vocabulary.add(record[1])
+            return
+
+        self.generation += 1
+        self.records += 1
+        old = self.entries.pop(record[1], None)
+        if old is not None and old['error'] is None:
+            self.frequencies.remove(self._features(old['row']))
+        if record[0] == 'put':
+            entry = record[2]
+            self.entries[record[1]] = entry
+            self.version = max(self.version, entry.get('version', 0))
+            if entry['error'] is None:
+                entry['row'] = self.store.append(record[3])
+                self.frequencies.add(self._features(entry['row']))
+
+    def _features(self, row: int) -> np.ndarray:
+        """Уникальные хэшированные признаки документа."""
+        return np.unique(self.vocabulary.features[self.store.row(row)])
+
+    def _append(self, records: List[tuple]) -> None:
+        """Дописывание записей в журнал. Вызывается под _file_lock после sync."""
+        if not records:
+            return
+        with open(self.index_path, 'ab') as f:
+            if f.tell() == 0:
+                header = self._new_header()
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                self._file_id = header[4]
+            for record in records:
+                pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            self._offset = f.tell()
+        for record in records:
+            self._apply(record)
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """Файлы базы на диске: имя -> (mtime_ns, размер)."""
+        files = {}
+        extensions = set(supported_extensions())
+        with os.scandir(self.database_dir) as it:
+            for item in it:
+                if not item.is_file() or \
+                        os.path.splitext(item.name)[1].lower() not in extensions:
+                    continue
+                stat = item.stat()
+                files[item.name] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def verify(self) -> Dict[str, List[str]]:
+        """Сравнение индекса с файлами на диске."""
+        files = self.scan()
+        with self.lock:
+            result = {'new': [], 'changed': [], 'missing': []}
+            for name, (mtime, size) in files.items():
+                entry = self.entries.get(name)
+                if entry is None:
+                    result['new'].append(name)
+                elif entry['mtime'] != mtime or entry['size'] != size:
+                    result['changed'].append(name)
+            result['missing'] = [
+                name for name in self.entries if name not in files]
+        for names in result.values():
+            names.sort()
+        return result
+
+    def build(self, workers: Optional[int] = 1, rebuild: bool = False,
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """
+        Индексация новых и изменённых файлов и удаление пропавших.
+        При rebuild=True индекс собирается заново.
+        workers=None — по числу ядер, 1 — в текущем процессе.
+        """
+        with self._file_lock():
+            if rebuild:
+                if self.index_path.exists():
+                    self.index_path.unlink()
+            self.sync()
+            diff = self.verify()
+
+        to_index = [str(self.database_dir / name)
+                    for name in diff['new'] + diff['changed']]
+        indexed = []
+        if workers == 1 or len(to_index) < 2:
+            results = (_index_file(path, self.remove_stopwords, self.lemmatize)
+                       for path in to_index)
+            for name, entry in results:
+                indexed.append((name, entry))
+                if progress:
+                    progress(len(indexed), len(to_index))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(
+                    _index_file, to_index,
+                    [self.remove_stopwords] * len(to_index),
+                    [self.lemmatize] * len(to_index),
+                    chunksize=max(1, len(to_index) // 64))
+                for name, entry in results:
+                    indexed.append((name, entry))
+                    if progress:
+                        progress(len(indexed), len(to_index))
+
+        with self._file_lock():
+            # Другой процесс мог проиндексировать те же файлы, пока шла обработка
+            self.sync()
+            records = []
+            for name, entry in indexed:
+                current = self.entries.get(name)
+                if current is None or current['mtime'] != entry['mtime'] \
+                        or current['size'] != entry['size']:
+                    records.extend(self._put_records(name, entry))
+                    if entry['error']:
+                        warnings.warn(
+                            f"Ошибка при загрузке файла {name}: {entry['error']}")
+            records.extend(('del', name) for name in diff['missing']
+                           if name in self.entries)
+            try:
+                self._append(records)
+            except Exception:
+                # Словарь в памяти мог опередить журнал: перечитываем с диска
+                self._reset()
+                self.sync()
+                raise
+
+        return {'indexed': len(indexed), 'removed': len(diff['missing']),
+                'errors': sum(entry['error'] is not None for _, entry in indexed)}
+
+    def _put_records(self, name: str, entry: dict) -> List[tuple]:
+        """Записи журнала для документа: новые токены словаря и сам документ."""
+        tokens = entry.pop('tokens')
+        # Вызывается под _file_lock после sync, поэтому версии не повторяются
+        # и в других процессах; время в микросекундах — чтобы версии росли
+        # и после пересборки индекса
+        entry['version'] = self.version = max(self.version + 1,
+                                              time.time_ns() // 1000)
+        records = []
+        new_tokens = self.vocabulary.missing(tokens)
+        if new_tokens:
+            records.append(('vocab', new_tokens))
+            # Повторное применение записи 'vocab' в _append ничего не меняет
+            self.vocabulary.add(new_tokens)
+        records.append(('put', name, entry, self.vocabulary.encode(tokens)))
+        return records
+
+    def delete(self, names: List[str]) -> List[str]:
+        """
+        Удаление документов из базы: файл удаляется из database_dir, а в журнал
+        дописывается запись 'del'. Документ сразу исключается из проверок,
+        место в журнале и хранилище освобождает compact.
+        Возвращает имена удалённых документов.
+        """
+        with self._file_lock():
+            self.sync()
+            deleted = []
+            for name in names:
+                if name not in self.entries:
+                    continue
+                # Сначала файл: если запись 'del' не успеет попасть в журнал,
+                # build всё равно удалит документ как пропавший с диска
+                try:
+                    os.unlink(self.path(name))
+                except FileNotFoundError:
+                    pass
+                deleted.append(name)
+            self._append([('del', name) for name in deleted])
+            return deleted
+
+    @property
+    def garbage_ratio(self) -> float:
+        """Доля устаревших записей журнала (удалённые и заменённые документы)."""
+        with self.lock:
+            return (self.records - len(self.entries)) / self.records if self.records else 0.0
+
+    def compact(self) -> int:
+        """
+        Перезапись журнала индекса без устаревших записей.
+        Возвращает число удалённых записей.
+        """
+        with self._file_lock():
+            self.sync()
+            garbage = self.records - len(self.entries)
+            tmp_path = self.index_path.with_suffix('.tmp')
+            header = self._new_header()
+            live = sorted(self.entries.items())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(('vocab', self.vocabulary.tokens),
+                            f, pickle.HIGHEST_PROTOCOL)
+                for name, entry in live:
+                    tokens = self.store.row(entry['row']) \
+                        if entry['error'] is None else None
+                    pickle.dump(('put', name, entry, tokens),
+                                f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+            os.replace(tmp_path, self.index_path)
+            self._file_id = header[4]
+            self.records = len(self.entries)
+
+            live = [entry for _, entry in live if entry['error'] is None]
+            self.store, rows = self.store.compact([entry['row'] for entry in live])
+            for entry, row in zip(live, rows):
+                entry['row'] = int(row)
+            self.generation += 1
+            return garbage
+
+    def documents(self) -> List[Tuple[str, dict]]:
+        """Пары (имя файла, запись индекса) успешно загруженных документов."""
+        with self.lock:
+            return [(name, entry) for name, entry in sorted(self.entries.items())
+                    if entry['error'] is None]
+
+    def path(self, name: str) -> str:
+        return str(self.database_dir / name)
+
+    def tokens(self, name: str) -> np.ndarray:
+        """Номера токенов предобработанного документа."""
+        with self.lock:
+            return self.store.row(self.entries[name]['row']).copy()
+
+    def text(self, name: str) -> str:
+        """Предобработанный текст документа."""
+        return ' '.join(self.vocabulary.decode(self.tokens(name)))
+
+    def raw_text(self, name: str) -> str:
+        """Исходный текст документа (извлекается из файла при обращении)."""
+        from app.core.extraction import extract_text
+        return extract_text(self.path(name))
+
+
+# Загруженные индексы процесса в порядке последнего использования.
+# Сверх MAX_CACHED_INDEXES вытесняются давно не использованные, кроме
+# закреплённых (_pinned); вытесненный индекс снова читается с диска.
+_indexes: 'OrderedDict[Tuple[str, str], CorpusIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+_pinned = set()
+MAX_CACHED_INDEXES = 8
+
+
+def _index_key(database_dir: str, index_dir: str) -> Tuple[str, str]:
+    return os.path.abspath(database_dir), os.path.abspath(index_dir)
+
+
+def configure_index_cache(max_indexes: int, pinned=()) -> None:
+    """Размер кэша индексов и пары каталогов, которые не вытесняются."""
+    global MAX_CACHED_INDEXES
+    with _indexes_lock:
+        MAX_CACHED_INDEXES = max(1, max_indexes)
+        _pinned.clear()
+        _pinned.update(_index_key(*dirs) for dirs in pinned)
+        _evict()
+
+
+def _evict() -> None:
+    for key in list(_indexes):
+        if len(_indexes) <= MAX_CACHED_INDEXES:
+            break
+        if key not in _pinned:
+            del _indexes[key]
+
+
+def get_corpus_index(database_dir: str, index_dir: str,
+                     refresh: bool = True) -> CorpusIndex:
+    """
+    Индекс базы из кэша процесса.
+    При refresh=True в индекс дописываются только новые и изменённые файлы.
+    """
+    key = _index_key(database_dir, index_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = CorpusIndex.load(database_dir, index_dir)
+            _indexes[key] = index
+            _evict()
+        else:
+            _indexes.move_to_end(key)
+    if refresh:
+        index.build(workers=1)
+    return index
+
+
+def cached_index(database_dir: str, index_dir: str) -> Optional[CorpusIndex]:
+    """Индекс, если он уже загружен в процессе (без чтения с диска)."""
+    with _indexes_lock:
+        return _indexes.get(_index_key(database_dir, index_dir))
+
+
+def drop_cached_index(database_dir: str, index_dir: str) -> None:
+    """Удаление индекса из кэша процесса (например, после пересборки)."""
+    with _indexes_lock:
+        _indexes.pop(_index_key(database_dir, index_dir), None)
+
+
+def warm_corpus_cache(database_dir: str, index_dir: str) -> CorpusIndex:
+    """
+    Прогрев: индекс доводится до состояния файлов на диске
+    и загружается в кэш процесса до первой проверки вместе с признаками
+    документов, обратным индексом этапа containment и моделью LSA (если она построена).
+    """
+    from app.core.cascade import corpus_features
+
+    index = get_corpus_index(database_dir, index_dir, refresh=True)
+    features = corpus_features(index)
+    features.lsa()
+    features.postings()
+    return index
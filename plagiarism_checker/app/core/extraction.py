@@ -0,0 +1,201 @@
+"""
+Извлечение текста из документов в отдельных процессах.
+
+Разбор PDF и DOCX может зависнуть или занять гигабайты памяти на
+испорченном файле, поэтому выполняется в пуле вспомогательных процессов
+с ограничением памяти (RLIMIT_AS) и времени на документ. Процесс,
+превысивший время, завершается и заменяется новым.
+"""
+import os
+import pickle
+import subprocess
+import sys
+import threading
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+EXTRACTION_WORKERS = 2
+EXTRACTION_TIMEOUT = 30.0
+EXTRACTION_MEMORY_LIMIT = 512 * 1024 * 1024
+
+# Каталог, из которого импортируется пакет app
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+class ExtractionError(IOError):
+    """Текст не извлечён: ошибка разбора или превышены ограничения."""
+
+
+class _Worker:
+    def __init__(self, memory_limit: int):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [_PROJECT_ROOT, env.get('PYTHONPATH')]))
+        # Потоки BLAS резервируют адресное пространство, которое учитывает RLIMIT_AS
+        env['OPENBLAS_NUM_THREADS'] = '1'
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'app.core.extraction', str(memory_limit)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+            cwd=_PROJECT_ROOT)
+        self.requests = Connection(os.dup(self.process.stdin.fileno()), readable=False)
+        self.responses = Connection(os.dup(self.process.stdout.fileno()), writable=False)
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.wait()
+        self.requests.close()
+        self.responses.close()
+
+
+class ExtractionPool:
+    """Пул процессов извлечения текста, переиспользуемых между документами."""
+
+    def __init__(self, workers: int = EXTRACTION_WORKERS,
+                 timeout: float = EXTRACTION_TIMEOUT,
+                 memory_limit: int = EXTRACTION_MEMORY_LIMIT):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._slots = threading.Semaphore(workers)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    def _take(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.poll() is None:
+                    return worker
+                worker.kill()
+        return _Worker(self.memory_limit)
+
+    def _give_back(self, worker: _Worker) -> None:
+        with self._lock:
+            self._idle.append(worker)
+
+    def extract(self, file_path: str) -> str:
+        """Текст документа; ExtractionError при ошибке или превышении ограничений."""
+        with self._slots:
+            worker = self._take()
+            try:
+                worker.requests.send_bytes(pickle.dumps(str(file_path)))
+                finished = worker.responses.poll(self.timeout)
+                response = pickle.loads(worker.responses.recv_bytes()) if finished else None
+            except (EOFError, OSError):
+                # Процесс завершился сам, например убит ядром при нехватке памяти
+                self._discard(worker)
+                raise ExtractionError('Процесс извлечения текста аварийно завершился')
+            if response is None:
+                self._discard(worker)
+                raise ExtractionError(
+                    f'Превышено время извлечения текста ({self.timeout:.0f} с)')
+            self._give_back(worker)
+
+        status, result = response
+        if status == 'ok':
+            return result
+        if status == 'memory':
+            raise ExtractionError(
+                f'Превышен лимит памяти при извлечении текста '
+                f'({self.memory_limit // (1024 * 1024)} МБ)')
+        raise ExtractionError(result)
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        self.restarts += 1
+
+    def close(self) -> None:
+        with self._lock:
+            for worker in self._idle:
+                worker.kill()
+            self._idle = []
+
+
+_pool: Optional[ExtractionPool] = None
+_pool_settings = {}
+_pool_lock = threading.Lock()
+
+
+def _forget_pool() -> None:
+    # Каналы к процессам пула принадлежат родителю: дочерний процесс
+    # (параллельная сборка индекса) создаёт свой пул
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_pool)
+
+
+def configure_extraction(workers: int = EXTRACTION_WORKERS,
+                         timeout: float = EXTRACTION_TIMEOUT,
+                         memory_limit: int = EXTRACTION_MEMORY_LIMIT) -> None:
+    """Настройки пула; пул создаётся при первом извлечении."""
+    global _pool
+    with _pool_lock:
+        _pool_settings.update(workers=workers, timeout=timeout,
+                              memory_limit=memory_limit)
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def extract_text(file_path: str) -> str:
+    """
+    Текст документа. TXT читается в текущем процессе (чтение файла
+    не может зависнуть), остальные форматы — в пуле процессов.
+    """
+    global _pool
+    if Path(file_path).suffix.lower() == '.txt':
+        from app.core.plagiarism_check import FileLoader
+        return FileLoader.load_text_from_file(file_path)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Файл не найден: {file_path}")
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool(**_pool_settings)
+        pool = _pool
+    return pool.extract(file_path)
+
+
+def _serve(memory_limit: int) -> None:
+    """Цикл процесса извлечения: путь на входе, (статус, текст) на выходе."""
+    requests = Connection(os.dup(0), writable=False)
+    responses = Connection(os.dup(1), readable=False)
+    # Вывод библиотек не должен попасть в канал ответов
+    os.dup2(2, 1)
+
+    from app.core.plagiarism_check import FileLoader
+    # Лимит ставится после импортов и ограничивает только разбор документов
+    if RESOURCE_AVAILABLE and memory_limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    while True:
+        try:
+            file_path = pickle.loads(requests.recv_bytes())
+        except EOFError:
+            return
+        try:
+            response = ('ok', FileLoader.load_text_from_file(file_path))
+        except MemoryError:
+            response = ('memory', None)
+        except Exception as e:
+            # FileLoader заворачивает все ошибки, в том числе MemoryError, в IOError
+            if isinstance(e.__context__, MemoryError):
+                response = ('memory', None)
+            else:
+                response = ('error', str(e))
+        responses.send_bytes(pickle.dumps(response))
+
+
+if __name__ == '__main__':
+    _serve(int(sys.argv[1]))
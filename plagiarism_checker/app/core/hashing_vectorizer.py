@@ -0,0 +1,109 @@
+import zlib
+from typing import Sequence, Tuple
+import numpy as np
+
+# Размер пространства признаков. Коллизии хэшей при 2^20 признаков
+# пренебрежимо мало влияют на косинусную меру.
+N_FEATURES = 2 ** 20
+CHUNK_SIZE = 1024
+
+
+def hash_features(tokens: Sequence[str],
+                  n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Признаки документа без словаря: номера признаков (хэши токенов)
+    и число вхождений, упорядоченные по номеру.
+    """
+    hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens),
+                         dtype=np.uint32, count=len(tokens)) % n_features
+    ids, counts = np.unique(hashes, return_counts=True)
+    return ids.astype(np.int32), counts.astype(np.int32)
+
+
+class DocumentFrequencies:
+    """
+    Документные частоты признаков базы. Обновляются при добавлении
+    и удалении документов, поэтому IDF не требует переобучения.
+    """
+
+    def __init__(self, n_features: int = N_FEATURES):
+        self.counts = np.zeros(n_features, dtype=np.int32)
+        self.n_docs = 0
+        # counts отдан снимку (snapshot) и копируется перед изменением
+        self._shared = False
+
+    def _own_counts(self) -> None:
+        if self._shared:
+            self.counts = self.counts.copy()
+            self._shared = False
+
+    def add(self, ids: np.ndarray) -> None:
+        self._own_counts()
+        self.counts[ids] += 1
+        self.n_docs += 1
+
+    def remove(self, ids: np.ndarray) -> None:
+        self._own_counts()
+        self.counts[ids] -= 1
+        self.n_docs -= 1
+
+    def snapshot(self) -> 'DocumentFrequencies':
+        """
+        Неизменяемый снимок частот без копирования массива: пока частоты
+        не меняются, снимки и исходный объект делят один массив, а при
+        изменении исходный объект копирует его один раз.
+        """
+        result = DocumentFrequencies.__new__(DocumentFrequencies)
+        result.counts = self.counts.view()
+        result.counts.flags.writeable = False
+        result.n_docs = self.n_docs
+        result._shared = True
+        self._shared = True
+        return result
+
+    def idf(self, ids: np.ndarray) -> np.ndarray:
+        """Сглаженный IDF, как в TfidfVectorizer(smooth_idf=True)."""
+        return np.log((1.0 + self.n_docs) / (1.0 + self.counts[ids])) + 1.0
+
+
+def tfidf_cosine(query_ids: np.ndarray, query_counts: np.ndarray,
+                 frequencies: DocumentFrequencies, token_features: np.ndarray,
+                 tokens: np.ndarray, offsets: np.ndarray,
+                 rows: np.ndarray) -> np.ndarray:
+    """
+    Косинусная мера TF-IDF запроса с документами rows.
+    Документы хранятся номерами токенов подряд в tokens, документ i
+    занимает [offsets[i], offsets[i + 1]); token_features переводит номер
+    токена в номер хэшированного признака.
+    Документы обрабатываются блоками по CHUNK_SIZE.
+    """
+    scores = np.zeros(len(rows))
+    query_weights = query_counts * frequencies.idf(query_ids)
+    query_norm = np.sqrt(np.dot(query_weights, query_weights))
+    if not len(rows) or query_norm == 0:
+        return scores
+
+    query_vector = np.zeros(len(frequencies.counts), dtype=np.float32)
+    query_vector[query_ids] = query_weights / query_norm
+    feature_bits = int(len(frequencies.counts) - 1).bit_length()
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        lengths = offsets[chunk + 1] - offsets[chunk]
+        if not lengths.sum():
+            continue
+        positions = np.concatenate([
+            np.arange(offsets[row], offsets[row + 1]) for row in chunk])
+        features = token_features[tokens[positions]].astype(np.int64)
+        # Пары (документ блока, признак) -> число вхождений
+        keys = (np.repeat(np.arange(len(chunk), dtype=np.int64), lengths)
+                << feature_bits) | features
+        keys, counts = np.unique(keys, return_counts=True)
+        doc = keys >> feature_bits
+        features = keys & ((1 << feature_bits) - 1)
+        weights = counts * frequencies.idf(features)
+        norms = np.sqrt(np.bincount(doc, weights * weights, minlength=len(chunk)))
+        dots = np.bincount(doc, weights * query_vector[features], minlength=len(chunk))
+        scores[start:start + len(chunk)] = np.where(
+            norms > 0, dots / np.maximum(norms, 1e-12), 0.0)
+    return scores
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+
+LSA_FILENAME = 'lsa.npz'
+DEFAULT_COMPONENTS = 256
+# Столбцы матрицы — самые частые токены, встречающиеся хотя бы в двух документах
+MAX_COLUMNS = 100000
+TILE_ROWS = 65536
+
+
+def _tfidf_matrix(features, rows: np.ndarray, column_of_token: np.ndarray,
+                  idf: np.ndarray):
+    """Нормированная матрица TF-IDF документов rows в столбцах модели."""
+    from scipy.sparse import csr_matrix
+    from sklearn.preprocessing import normalize
+
+    offsets = features.store.offsets
+    tokens = features.store.tokens
+    parts = []
+    for start in range(0, len(rows), 1024):
+        chunk = rows[start:start + 1024]
+        lengths = offsets[chunk + 1] - offsets[chunk]
+        positions = np.concatenate(
+            [np.arange(offsets[row], offsets[row + 1]) for row in chunk]) \
+            if len(chunk) else np.empty(0, np.int64)
+        columns = column_of_token[tokens[positions]]
+        doc = np.repeat(np.arange(len(chunk)), lengths)
+        known = columns >= 0
+        parts.append(csr_matrix(
+            (idf[columns[known]], (doc[known], columns[known])),
+            shape=(len(chunk), len(idf)), dtype=np.float32))
+    if not parts:
+        return csr_matrix((0, len(idf)), dtype=np.float32)
+    from scipy.sparse import vstack
+    # Повторяющиеся пары (документ, столбец) суммируются: tf * idf
+    return normalize(vstack(parts).tocsr())
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class LsaModel:
+    """
+    Латентно-семантическая модель базы: проекция TF-IDF на
+    n_components измерений усечённым SVD.
+    Эмбеддинги документов хранятся матрицей float32, сходство запроса
+    со всей базой — одно умножение матрицы на вектор.
+    """
+
+    def __init__(self, column_tokens: List[str], idf: np.ndarray,
+                 components: np.ndarray, names: List[str],
+                 embeddings: np.ndarray):
+        self.column_tokens = column_tokens
+        self.idf = idf.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.names = names
+        self.embeddings = embeddings.astype(np.float32)
+
+    @classmethod
+    def fit(cls, features, n_components: int = DEFAULT_COMPONENTS,
+            max_columns: int = MAX_COLUMNS) -> 'LsaModel':
+        from sklearn.decomposition import TruncatedSVD
+
+        vocabulary = features.vocabulary
+        frequencies = features.frequencies
+        df = frequencies.counts[vocabulary.features]
+        columns = np.flatnonzero(df >= 2)
+        columns = columns[np.argsort(-df[columns], kind='stable')[:max_columns]]
+        if len(columns) < 2 or len(features) < 2:
+            raise ValueError("Недостаточно документов для построения LSA")
+
+        column_of_token = np.full(len(vocabulary), -1, dtype=np.int64)
+        column_of_token[columns] = np.arange(len(columns))
+        idf = frequencies.idf(vocabulary.features[columns])
+
+        matrix = _tfidf_matrix(features, features.rows, column_of_token, idf)
+        n_components = min(n_components, len(columns) - 1, len(features) - 1)
+        svd = TruncatedSVD(n_components=n_components, random_state=0)
+        embeddings = svd.fit_transform(matrix)
+        return cls([vocabulary.tokens[i] for i in columns], idf,
+                   svd.components_, list(features.names),
+                   _normalize_rows(embeddings))
+
+    def save(self, path: Path) -> None:
+        tmp_path = Path(str(path) + '.tmp.npz')
+        np.savez(tmp_path,
+                 column_tokens=np.array(self.column_tokens, dtype=object),
+                 idf=self.idf, components=self.components,
+                 names=np.array(self.names, dtype=object),
+                 embeddings=self.embeddings)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'LsaModel':
+        with np.load(path, allow_pickle=True) as data:
+            return cls(list(data['column_tokens']), data['idf'],
+                       data['components'], list(data['names']),
+                       data['embeddings'])
+
+    def bind(self, features) -> 'BoundLsa':
+        """
+        Привязка модели к текущему состоянию индекса. Документы,
+        добавленные после построения модели, проецируются на готовые
+        компоненты (fold-in), удалённые — пропускаются.
+        """
+        vocabulary = features.vocabulary
+        column_of_token = np.full(len(vocabulary), -1, dtype=np.int64)
+        for column, token in enumerate(self.column_tokens):
+            token_id = vocabulary.ids.get(token)
+            if token_id is not None:
+                column_of_token[token_id] = column
+
+        position = {name: i for i, name in enumerate(self.names)}
+        embeddings = np.empty((len(features), self.components.shape[0]),
+                              dtype=np.float32)
+        missing = []
+        for i, name in enumerate(features.names):
+            j = position.get(name)
+            if j is None:
+                missing.append(i)
+            else:
+                embeddings[i] = self.embeddings[j]
+        if missing:
+            missing = np.array(missing)
+            matrix = _tfidf_matrix(features, features.rows[missing],
+                                   column_of_token, self.idf)
+            embeddings[missing] = _normalize_rows(
+                matrix @ self.components.T)
+        return BoundLsa(self, column_of_token, embeddings, len(missing))
+
+
+class BoundLsa:
+    def __init__(self, model: LsaModel, column_of_token: np.ndarray,
+                 embeddings: np.ndarray, folded_in: int):
+        self.model = model
+        self.column_of_token = column_of_token
+        self.embeddings = embeddings
+        self.folded_in = folded_in
+
+    def query_vector(self, ids: np.ndarray) -> np.ndarray:
+        """Нормированный эмбеддинг запроса по номерам его токенов."""
+        known = ids[ids >= 0]
+        columns = self.column_of_token[known]
+        columns = columns[columns >= 0]
+        vector = np.bincount(columns, minlength=len(self.model.idf)) \
+            * self.model.idf
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return np.zeros(self.model.components.shape[0], dtype=np.float32)
+        embedding = self.model.components @ (vector / norm).astype(np.float32)
+        return embedding / max(np.linalg.norm(embedding), 1e-12)
+
+    def scores(self, query: np.ndarray,
+               candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """Косинус запроса с документами; блоками по TILE_ROWS строк."""
+        if candidates is None or len(candidates) == len(self.embeddings):
+            matrix = self.embeddings
+        else:
+            matrix = self.embeddings[candidates]
+        result = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), TILE_ROWS):
+            result[start:start + TILE_ROWS] = matrix[start:start + TILE_ROWS] @ query
+        return result
+
+    def top_k(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k ближайших документов: частичная сортировка по блокам."""
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self.embeddings), TILE_ROWS):
+            tile = self.embeddings[start:start + TILE_ROWS] @ query
+            rows = np.arange(start, start + len(tile))
+            if len(tile) > k:
+                top = np.argpartition(-tile, k)[:k]
+                rows, tile = rows[top], tile[top]
+            best_rows = np.concatenate((best_rows, rows))
+            best_scores = np.concatenate((best_scores, tile))
+            if len(best_scores) > k:
+                top = np.argpartition(-best_scores, k)[:k]
+                best_rows, best_scores = best_rows[top], best_scores[top]
+        order = np.argsort(-best_scores, kind='stable')
+        return best_rows[order], best_scores[order]
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_lsa_model(index_dir) -> Optional[LsaModel]:
+    """Модель LSA из каталога индекса (кэшируется до изменения файла)."""
+    path = Path(index_dir) / LSA_FILENAME
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _models_lock:
+        cached = _models.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        model = LsaModel.load(path)
+        _models[path] = (mtime, model)
+        return model
+
+
+def lsa_recall(features, lsa: BoundLsa, queries: int = 100, k: int = 10,
+               seed: int = 0) -> dict:
+    """
+    Полнота LSA относительно точной меры TF-IDF: доля k лучших
+    по TF-IDF документов, попавших в k лучших по LSA.
+    Запросами служат случайные документы базы (сам документ исключается).
+    """
+    from app.core.hashing_vectorizer import hash_features, tfidf_cosine
+
+    rng = np.random.RandomState(seed)
+    sample = rng.choice(len(features), min(queries, len(features)), replace=False)
+    all_rows = np.arange(len(features))
+    found = 0
+    expected = 0
+    exact_time = lsa_time = 0.0
+    for i in sample:
+        ids = features.tokens(i)
+        started = time.perf_counter()
+        query_ids, query_counts = hash_features(features.vocabulary.decode(ids))
+        exact = tfidf_cosine(query_ids, query_counts, features.frequencies,
+                             features.vocabulary.features, features.store.tokens,
+                             features.store.offsets, features.rows)
+        exact[i] = -1.0
+        exact_top = all_rows[np.argsort(-exact, kind='stable')[:k]]
+        exact_top = exact_top[exact[exact_top] > 0]
+        exact_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows, _ = lsa.top_k(lsa.query_vector(ids), k + 1)
+        lsa_top = rows[rows != i][:k]
+        lsa_time += time.perf_counter() - started
+
+        found += len(np.intersect1d(exact_top, lsa_top))
+        expected += len(exact_top)
+    return {
+        'queries': len(sample),
+        'recall': found / expected if expected else 1.0,
+        'exact_ms': 1000 * exact_time / max(len(sample), 1),
+        'lsa_ms': 1000 * lsa_time / max(len(sample), 1),
+    }
@@ -1,41 +1,100 @@
+import mmap
 import os
 import re
+import threading
 import warnings
+from collections import Counter, OrderedDict
+from importlib.util import find_spec
 from typing import List, Dict, Tuple, Optional
 from pathlib import Path
-import numpy as np
 from app.core.text_preprocessor import TextPreprocessor
 
-try:
-    import PyPDF2
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
+# Тяжёлые библиотеки импортируются при первом использовании;
+# при загрузке модуля проверяется только их наличие
+PDF_AVAILABLE = find_spec('PyPDF2') is not None
+if not PDF_AVAILABLE:
     warnings.warn("PyPDF2 не установлен. PDF файлы не будут поддерживаться.")
 
-try:
-    import docx
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+DOCX_AVAILABLE = find_spec('docx') is not None
+if not DOCX_AVAILABLE:
     warnings.warn(
         "python-docx не установлен. DOCX файлы не будут поддерживаться.")
 
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-    SKLEARN_AVAILABLE = True
-except ImportError:
-    SKLEARN_AVAILABLE = False
+SKLEARN_AVAILABLE = find_spec('sklearn') is not None
+if not SKLEARN_AVAILABLE:
     warnings.warn(
         "scikit-learn не установлен. Проверка будет использовать простой алгоритм.")
 
 
+# Файлы больше этого размера не читаются в память, а отображаются через mmap
+MMAP_THRESHOLD = 4 * 1024 * 1024
+# Объём начала файла, по которому определяется однобайтовая кодировка
+ENCODING_SAMPLE_SIZE = 256 * 1024
+ENCODING_CACHE_SIZE = 4096
+
+LEGACY_CYRILLIC_ENCODINGS = ['cp1251', 'koi8-r', 'iso-8859-5']
+
+# Частоты букв русского языка, %
+RUSSIAN_LETTER_FREQUENCIES = {
+    'о': 10.97, 'е': 8.45, 'а': 8.01, 'и': 7.35, 'н': 6.70, 'т': 6.26,
+    'с': 5.47, 'р': 4.73, 'в': 4.54, 'л': 4.40, 'к': 3.49, 'м': 3.21,
+    'д': 2.98, 'п': 2.81, 'у': 2.62, 'я': 2.01, 'ы': 1.90, 'ь': 1.74,
+    'г': 1.70, 'з': 1.65, 'б': 1.59, 'ч': 1.44, 'й': 1.21, 'х': 0.97,
+    'ж': 0.94, 'ш': 0.73, 'ю': 0.64, 'ц': 0.48, 'щ': 0.36, 'э': 0.32,
+    'ф': 0.26, 'ъ': 0.04, 'ё': 0.04
+}
+
+
+def _byte_weights(encoding: str) -> Dict[int, float]:
+    """Вес каждого байта 0x80-0xFF как буквы русского текста в кодировке."""
+    weights = {}
+    for byte in range(0x80, 0x100):
+        char = bytes([byte]).decode(encoding, errors='ignore')
+        frequency = RUSSIAN_LETTER_FREQUENCIES.get(char.lower(), 0.0)
+        # Заглавные буквы встречаются в тексте редко
+        weights[byte] = frequency if char.islower() else frequency * 0.1
+    return weights
+
+
+_ENCODING_WEIGHTS = {encoding: _byte_weights(encoding)
+                     for encoding in LEGACY_CYRILLIC_ENCODINGS}
+_ASCII_BYTES = bytes(range(0x80))
+
+
+def detect_legacy_encoding(data) -> str:
+    """
+    Определение однобайтовой кириллической кодировки
+    по распределению байтов в начале файла.
+    """
+    high_bytes = Counter(
+        bytes(data[:ENCODING_SAMPLE_SIZE]).translate(None, _ASCII_BYTES))
+    scores = {
+        encoding: sum(count * weights[byte]
+                      for byte, count in high_bytes.items())
+        for encoding, weights in _ENCODING_WEIGHTS.items()
+    }
+    return max(LEGACY_CYRILLIC_ENCODINGS, key=lambda e: scores[e])
+
+
+def supported_extensions() -> List[str]:
+    """Расширения файлов, которые можно загрузить с установленными библиотеками."""
+    extensions = ['.txt']
+    if PDF_AVAILABLE:
+        extensions.append('.pdf')
+    if DOCX_AVAILABLE:
+        extensions.extend(['.docx', '.doc'])
+    return extensions
+
+
 class FileLoader:
     """
     Класс для загрузки текста из файлов разных форматов.
     """
 
+    # (путь, размер, mtime) -> кодировка TXT-файла
+    _encoding_cache: 'OrderedDict[tuple, str]' = OrderedDict()
+    _encoding_cache_lock = threading.Lock()
+
     @staticmethod
     def load_text_from_file(file_path: str) -> str:
 
@@ -74,18 +133,43 @@ class FileLoader:
 
     @staticmethod
     def _load_txt(file_path: Path) -> str:
-        """Загрузка текста из TXT файла."""
-        encodings = ['utf-8', 'cp1251', 'koi8-r', 'iso-8859-5']
-
-        for encoding in encodings:
+        """
+        Загрузка текста из TXT файла.
+        Файл читается один раз (большие — через mmap); кодировка определяется
+        по содержимому и кэшируется для файла.
+        """
+        stat = os.stat(file_path)
+        if stat.st_size == 0:
+            return ""
+
+        with open(file_path, 'rb') as f:
+            if stat.st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return FileLoader._decode(data, file_path, stat)
+            return FileLoader._decode(f.read(), file_path, stat)
+
+    @classmethod
+    def _decode(cls, data, file_path: Path, stat: os.stat_result) -> str:
+        key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+        with cls._encoding_cache_lock:
+            encoding = cls._encoding_cache.get(key)
+            if encoding is not None:
+                cls._encoding_cache.move_to_end(key)
+
+        if encoding is None:
             try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    return f.read()
+                text = str(data, 'utf-8')
+                encoding = 'utf-8'
             except UnicodeDecodeError:
-                continue
+                encoding = detect_legacy_encoding(data)
+                text = str(data, encoding, 'ignore')
+            with cls._encoding_cache_lock:
+                cls._encoding_cache[key] = encoding
+                if len(cls._encoding_cache) > ENCODING_CACHE_SIZE:
+                    cls._encoding_cache.popitem(last=False)
+            return text
 
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            return f.read()
+        return str(data, encoding, 'ignore')
 
     @staticmethod
     def _load_pdf(file_path: Path) -> str:
@@ -94,6 +178,8 @@ class FileLoader:
             raise ImportError(
                 "PyPDF2 не установлен. Установите его для работы с PDF.")
 
+        import PyPDF2
+
         text = ""
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
@@ -109,6 +195,8 @@ class FileLoader:
             raise ImportError(
                 "python-docx не установлен. Установите его для работы с DOCX.")
 
+        import docx
+
         doc = docx.Document(file_path)
         text = ""
         for paragraph in doc.paragraphs:
@@ -126,7 +214,12 @@ class PlagiarismChecker:
                  database_dir: str,
                  remove_stopwords: bool = True,
                  lemmatize: bool = True,
-                 use_tfidf: bool = True):
+                 use_tfidf: bool = True,
+                 index=None,
+                 cascade: Optional[List[dict]] = None,
+                 windows: Optional[dict] = None,
+                 partitions: Optional[List[tuple]] = None,
+                 partition_cascades: Optional[Dict[str, List[dict]]] = None):
 
         self.database_dir = Path(database_dir)
         self.remove_stopwords = remove_stopwords
@@ -137,22 +230,46 @@ class PlagiarismChecker:
             raise FileNotFoundError(
                 f"Директория с базой документов не найдена: {database_dir}")
 
-        self.database_texts = []
         self.database_files = []
         self.preprocessed_database = []
 
-        self._load_database()
+        # С индексом база не загружается в списки: признаки документов
+        # берутся из кэша индекса, а сравнение идёт каскадом этапов
+        self.index = index
+        self.cascade = cascade
+        # Каскады отдельных разделов (например, LSA там, где построена модель);
+        # для остальных разделов — cascade. Без разделов ключ — None
+        self.partition_cascades = partition_cascades or {}
+        # Проверка длинных документов по окнам (см. app.core.windows):
+        # size, min_chars, stop_similarity, min_windows
+        self.windows = windows
+        self.features = None
+        # Пары (раздел базы, признаки); без разделов — один индекс index
+        self.partition_features = []
+        self.last_result = None
+
+        if partitions:
+            self._load_index(partitions)
+        elif index is not None:
+            self._load_index([(None, index)])
+        else:
+            self._load_database()
+
+    def _load_index(self, partitions: List[tuple]) -> None:
+        """Подготовка признаков документов из готовых индексов (раздел, индекс)."""
+        from app.core.cascade import corpus_features
+        self.partition_features = [(name, corpus_features(index))
+                                   for name, index in partitions]
+        self.features = self.partition_features[0][1]
+
+        if not any(len(features) for _, features in self.partition_features):
+            warnings.warn(
+                f"В директории {self.database_dir} не найдено файлов для сравнения")
 
     def _load_database(self) -> None:
         """Загрузка и предобработка документов из базы данных."""
 
-        extensions = ['.txt']
-        if PDF_AVAILABLE:
-            extensions.append('.pdf')
-        if DOCX_AVAILABLE:
-            extensions.extend(['.docx', '.doc'])
-
-        for ext in extensions:
+        for ext in supported_extensions():
             files = list(self.database_dir.glob(f'*{ext}'))
             self.database_files.extend(files)
 
@@ -169,7 +286,6 @@ class PlagiarismChecker:
                     lemmatize=self.lemmatize
                 )
 
-                self.database_texts.append(text)
                 self.preprocessed_database.append(preprocessed)
 
             except Exception as e:
@@ -198,6 +314,8 @@ class PlagiarismChecker:
                                     all_texts: List[str]) -> float:
 
         try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.metrics.pairwise import cosine_similarity
 
             vectorizer = TfidfVectorizer()
 
@@ -219,23 +337,100 @@ class PlagiarismChecker:
                 f"Ошибка при расчете TF-IDF: {str(e)}. Используется простой метод.")
             return self._calculate_similarity_simple(text1, text2)
 
-    def check_plagiarism(self, file_to_check: str) -> float:
+    def _score_partitions(self, score, progress=None):
+        """
+        Оценка score(каскад раздела, признаки, progress) по каждому разделу
+        базы; результат с наибольшим сходством (с разделом в атрибуте
+        partition) или None.
+        Ход проверки 30–100% делится между разделами поровну.
+        """
+        searched = [(name, features) for name, features in self.partition_features
+                    if len(features)]
+        best = None
+        for number, (name, features) in enumerate(searched):
+            partition_progress = None
+            if progress is not None:
+                def partition_progress(stage, percent, number=number):
+                    progress(stage, 30 + (70 * number + percent - 30) / len(searched))
+            cascade = self.partition_cascades.get(name, self.cascade)
+            result = score(cascade, features, partition_progress)
+            result.partition = name
+            if best is None or result.similarity > best.similarity:
+                best = result
+        return best
+
+    def _check_cascade(self, preprocessed_text: str, progress=None) -> float:
+        from app.core.cascade import CascadeScorer
+
+        self.last_result = self._score_partitions(
+            lambda cascade, features, partition_progress: CascadeScorer(cascade).score(
+                features, preprocessed_text, partition_progress), progress)
+        if self.last_result is None:
+            return 100.0
+        originality_percent = (1 - self.last_result.similarity) * 100
+        originality_percent = max(0.0, min(100.0, originality_percent))
+        return round(originality_percent, 2)
+
+    def _check_windows(self, text: str, progress=None) -> float:
+        from app.core.cascade import CascadeScorer
+        from app.core.stages import DEFAULT_CASCADE
+        from app.core.windows import score_windows, window_cascade
+
+        self.last_result = self._score_partitions(
+            lambda cascade, features, partition_progress: score_windows(
+                CascadeScorer(window_cascade(cascade or DEFAULT_CASCADE)), features, text,
+                remove_stopwords=self.remove_stopwords,
+                lemmatize=self.lemmatize,
+                size=self.windows['size'],
+                stop_similarity=self.windows['stop_similarity'],
+                min_windows=self.windows['min_windows'],
+                progress=partition_progress), progress)
+        if self.last_result is None:
+            return 100.0
+        originality_percent = (1 - self.last_result.similarity) * 100
+        originality_percent = max(0.0, min(100.0, originality_percent))
+        return round(originality_percent, 2)
+
+    def check_plagiarism(self, file_to_check: str, progress=None,
+                         text: Optional[str] = None) -> float:
+        """
+        Процент оригинальности файла. progress(этап, процент), если задан,
+        вызывается по ходу проверки. Уже извлечённый текст передаётся в text.
+        """
+        if progress is None:
+            def progress(stage, percent):
+                pass
+
         try:
 
-            original_text = FileLoader.load_text_from_file(file_to_check)
+            if text is None:
+                progress('Извлечение текста', 5)
+                text = FileLoader.load_text_from_file(file_to_check)
+            original_text = text
+            if self.features is not None and self.windows \
+                    and len(original_text) >= self.windows['min_chars']:
+                # Длинный документ: предобработка и сравнение по окнам
+                return self._check_windows(original_text, progress)
+            progress('Предобработка текста', 15)
             preprocessed_text = TextPreprocessor.preprocess_text(
                 original_text,
                 remove_stop=self.remove_stopwords,
                 lemmatize=self.lemmatize
             )
 
+            if self.features is not None:
+                return self._check_cascade(preprocessed_text, progress)
+
             if not self.preprocessed_database:
 
                 return 100.0
 
             max_similarity = 0.0
 
-            for db_text in self.preprocessed_database:
+            total = len(self.preprocessed_database)
+            for done, db_text in enumerate(self.preprocessed_database):
+                if done % 50 == 0:
+                    progress('Сравнение с источниками', 30 + 70 * done / total)
                 if self.use_tfidf:
                     similarity = self._calculate_similarity_tfidf(
                         preprocessed_text,
@@ -264,7 +459,32 @@ class PlagiarismChecker:
                 raise RuntimeError(f"Ошибка при проверке плагиата: {str(e)}")
 
 
-def check_document_originality(file_to_check: str, database_dir: str) -> float:
+def check_document_originality(file_to_check: str, database_dir: str,
+                               index_dir: Optional[str] = None,
+                               cascade: Optional[List[dict]] = None,
+                               engine: str = 'cascade',
+                               progress=None,
+                               text: Optional[str] = None,
+                               details: Optional[dict] = None,
+                               windows: Optional[dict] = None,
+                               partitions: Optional[Dict[str, Tuple[str, str]]] = None) -> float:
+    """
+    Процент оригинальности документа относительно базы источников.
+    Если задан index_dir, база берётся из индекса, а не читается целиком,
+    и сравнение идёт каскадом этапов cascade (по умолчанию DEFAULT_CASCADE).
+    Движок 'lsa' отбирает кандидатов по эмбеддингам LSA в тех разделах,
+    для которых построена модель; в остальных используется каскад.
+    progress(этап, процент) получает ход проверки; text — уже извлечённый
+    текст документа (иначе он читается из файла).
+    В словарь details, если он передан и используется индекс, записываются
+    версия базы (corpus_version), сходство с лучшим источником (similarity)
+    и имя этого источника (best_source). Настройки windows включают проверку
+    длинных документов по окнам; тогда в details есть и профиль окон (profile).
+    partitions — разделы базы для поиска: имя -> (каталог документов,
+    каталог индекса). Каталоги разделов лежат внутри database_dir, поэтому
+    best_source — путь источника относительно database_dir; версия базы
+    записывается, только если среди разделов есть сам database_dir.
+    """
     try:
 
         if not os.path.exists(file_to_check):
@@ -279,14 +499,65 @@ def check_document_originality(file_to_check: str, database_dir: str) -> float:
             raise ValueError(
                 f"Указанный путь не является директорией: {database_dir}")
 
+        index = None
+        indexes = None
+        partition_cascades = {}
+        if index_dir is not None:
+            from app.core.corpus_index import get_corpus_index
+            if progress is not None:
+                progress('Загрузка индекса базы', 2)
+            if partitions:
+                indexes = [(name, get_corpus_index(*dirs))
+                           for name, dirs in partitions.items()]
+            else:
+                index = get_corpus_index(database_dir, index_dir)
+            if engine == 'lsa':
+                # Модель LSA строится для каждого индекса отдельно,
+                # поэтому выбор каскада — по каталогу индекса раздела
+                from app.core.stages import LSA_CASCADE
+                from app.core.lsa import load_lsa_model
+                index_dirs = {name: dirs[1] for name, dirs in partitions.items()} \
+                    if partitions else {None: index_dir}
+                partition_cascades = {name: LSA_CASCADE
+                                      for name, path in index_dirs.items()
+                                      if load_lsa_model(path) is not None}
+
         checker = PlagiarismChecker(
             database_dir=database_dir,
             remove_stopwords=True,
             lemmatize=True,
-            use_tfidf=True
+            use_tfidf=True,
+            index=index,
+            cascade=cascade,
+            windows=windows,
+            partitions=indexes,
+            partition_cascades=partition_cascades
         )
 
-        originality = checker.check_plagiarism(file_to_check)
+        originality = checker.check_plagiarism(file_to_check, progress, text)
+
+        if details is not None and checker.features is not None:
+            result = checker.last_result
+            best_path = result and result.best_path
+            root = os.path.abspath(database_dir)
+            # Версия базы — только самого database_dir (не разделов)
+            versions = [features.version for _, features in checker.partition_features
+                        if os.path.abspath(features.index.database_dir) == root]
+            details.update(
+                corpus_version=versions[0] if versions else None,
+                similarity=result.similarity if result else 0.0,
+                best_source=os.path.relpath(best_path, root) if best_path else None)
+            if hasattr(result, 'profile'):
+                windows_profile = result.profile
+                # Источники окон — имена файлов в каталоге того же раздела
+                folder = os.path.relpath(os.path.dirname(best_path), root) \
+                    if best_path else os.curdir
+                if folder != os.curdir:
+                    windows_profile = [
+                        [start, end, similarity, source and f'{folder}/{source}']
+                        for start, end, similarity, source in windows_profile]
+                details['profile'] = {'windows': windows_profile,
+                                      'stopped_early': result.stopped_early}
 
         return originality
 
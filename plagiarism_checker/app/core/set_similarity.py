@@ -0,0 +1,136 @@
+"""
+Точный поиск документов с мерой Жаккара не ниже порога (AllPairs/PPJoin).
+
+Токены каждого документа упорядочиваются по редкости в базе (сначала
+редкие). Если J(x, y) >= t, то |x ∩ y| >= ceil(t·|x|), поэтому первые
+|x| - ceil(t·|x|) + 1 токенов (префиксы) x и y обязательно пересекаются.
+Поиск просматривает только списки документов префиксных токенов запроса,
+отбрасывает документы с невозможным размером (t·|x| <= |y| <= |x|/t) и
+с позицией совпадения, после которой пересечение уже не наберётся
+(позиционный фильтр PPJoin). Оставшиеся кандидаты проверяются точно,
+поэтому результат совпадает с полным перебором.
+"""
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Пороги, по которым best_match ищет наибольшее сходство (последний — 0)
+BEST_MATCH_THRESHOLDS = (0.8, 0.5, 0.3, 0.15, 0.0)
+
+
+def jaccard(x: set, y: set) -> float:
+    if not x or not y:
+        return 0.0
+    common = len(x & y)
+    return common / (len(x) + len(y) - common)
+
+
+def _prefix_length(size: int, threshold: float) -> int:
+    if threshold <= 0:
+        return size
+    # Допуск на ошибку округления, иначе префикс может оказаться короче нужного
+    return size - math.ceil(threshold * size - 1e-9) + 1
+
+
+def _required_overlap(x_size: int, y_size: int, threshold: float) -> int:
+    """Наименьшее пересечение, при котором J(x, y) >= threshold."""
+    return math.ceil(threshold / (1 + threshold) * (x_size + y_size) - 1e-9)
+
+
+class JaccardIndex:
+    """
+    Индекс множеств токенов для поиска по порогу меры Жаккара.
+    Документ — последовательность токенов (строк или чисел); повторы не учитываются.
+    """
+
+    def __init__(self, documents: Iterable[Sequence]):
+        sets = [set(tokens) for tokens in documents]
+        frequencies = Counter(token for tokens in sets for token in tokens)
+        # Глобальный порядок: редкие токены раньше, при равенстве — по порядку появления
+        self.rank: Dict = {token: rank for rank, (token, _) in enumerate(
+            sorted(frequencies.items(), key=lambda item: item[1]))}
+        self.sets = sets
+        self.sizes = [len(tokens) for tokens in sets]
+        # Токен -> [(документ, позиция токена в упорядоченном документе)]
+        self.postings: Dict = {}
+        for doc, tokens in enumerate(sets):
+            for position, token in enumerate(sorted(tokens, key=self.rank.__getitem__)):
+                self.postings.setdefault(token, []).append((doc, position))
+
+    def __len__(self):
+        return len(self.sets)
+
+    def _ordered(self, query: set) -> list:
+        # Неизвестные базе токены ни с чем не совпадут: они самые редкие
+        return sorted(query, key=lambda token: (token in self.rank,
+                                                self.rank.get(token, 0)))
+
+    def search(self, tokens: Sequence, threshold: float,
+               stats: Optional[dict] = None) -> List[Tuple[int, float]]:
+        """
+        Документы с J >= threshold: пары (номер, сходство) по убыванию сходства.
+        В stats (если передан) — число просмотренных записей списков,
+        кандидатов и точных проверок.
+        """
+        query = set(tokens)
+        if not query:
+            return []
+        size = len(query)
+        ordered = self._ordered(query)
+        prefix = _prefix_length(size, threshold)
+        # Допуск, чтобы граничные размеры не отсеивались из-за округления
+        min_size = threshold * size - 1e-9
+        max_size = size / threshold + 1e-9 if threshold > 0 else float('inf')
+
+        overlaps = {}
+        pruned = set()
+        touched = 0
+        for i, token in enumerate(ordered[:prefix]):
+            for doc, j in self.postings.get(token, ()):
+                touched += 1
+                if doc in pruned:
+                    continue
+                y_size = self.sizes[doc]
+                if not min_size <= y_size <= max_size:
+                    continue
+                if j >= _prefix_length(y_size, threshold):
+                    continue
+                seen = overlaps.get(doc, 0)
+                # Позиционный фильтр: после i-го и j-го токенов совпасть может не больше
+                if seen + 1 + min(size - i - 1, y_size - j - 1) < \
+                        _required_overlap(size, y_size, threshold):
+                    overlaps.pop(doc, None)
+                    pruned.add(doc)
+                    continue
+                overlaps[doc] = seen + 1
+
+        matches = []
+        verified = 0
+        for doc, seen in overlaps.items():
+            y_size = self.sizes[doc]
+            if prefix == size and _prefix_length(y_size, threshold) == y_size:
+                # Просмотрены все токены обоих документов: пересечение известно
+                common = seen
+            else:
+                verified += 1
+                common = len(query & self.sets[doc])
+            similarity = common / (size + y_size - common)
+            if similarity >= threshold:
+                matches.append((doc, similarity))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+
+        if stats is not None:
+            stats.update(touched=touched, candidates=len(overlaps), verified=verified)
+        return matches
+
+    def best_match(self, tokens: Sequence) -> Tuple[Optional[int], float]:
+        """
+        Документ с наибольшим сходством и само сходство.
+        Пороги снижаются по BEST_MATCH_THRESHOLDS до первого найденного
+        документа: все документы выше порога найдены, значит, лучший среди них.
+        """
+        for threshold in BEST_MATCH_THRESHOLDS:
+            matches = self.search(tokens, threshold)
+            if matches and matches[0][1] > 0:
+                return matches[0]
+        return None, 0.0
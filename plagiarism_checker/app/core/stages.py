@@ -0,0 +1,69 @@
+"""
+Настройки каскада и движков проверки. Модуль не импортирует NumPy,
+поэтому его можно использовать в маршрутах без загрузки движков.
+"""
+from typing import List
+
+# Этапы в порядке возрастания стоимости
+STAGES = ['length', 'minhash', 'containment', 'jaccard', 'lsa', 'tfidf', 'alignment']
+
+# Этапы, оценка которых может быть итоговым сходством; остальные —
+# только фильтры (верхняя граница по длине, оценки MinHash, доля общих слов
+# и мера Жаккара)
+FINAL_STAGES = ('tfidf', 'alignment')
+
+STAGE_TITLES = {
+    'length': 'Длина и размер словаря',
+    'minhash': 'Оценка MinHash',
+    'containment': 'Доля слов текста в источнике',
+    'jaccard': 'Точная мера Жаккара',
+    'lsa': 'Латентно-семантический анализ (LSA)',
+    'tfidf': 'Косинусная мера TF-IDF',
+    'alignment': 'Выравнивание фрагментов',
+}
+
+# Кандидаты отбираются по доле слов текста, найденных в источнике, без
+# порога: мера Жаккара и граница по длине занижают сходство фрагмента,
+# взятого из большого источника, и порог по ним отбросил бы такой источник
+DEFAULT_CASCADE = [
+    {'stage': 'containment', 'top_k': 100, 'min_score': 0.0},
+    {'stage': 'tfidf', 'top_k': 10, 'min_score': 0.0},
+]
+
+# Движок LSA: кандидаты по плотным эмбеддингам, точная оценка TF-IDF
+LSA_CASCADE = [
+    {'stage': 'lsa', 'top_k': 50, 'min_score': 0.0},
+    {'stage': 'tfidf', 'top_k': 10, 'min_score': 0.0},
+]
+
+ENGINES = {
+    'cascade': 'Каскад фильтров',
+    'lsa': 'LSA (быстрый приближённый поиск)',
+}
+
+
+def validate_cascade(stages: List[dict]) -> List[dict]:
+    """Проверка и нормализация настроек каскада."""
+    result = []
+    seen = set()
+    for item in stages:
+        stage = item.get('stage')
+        if stage not in STAGES:
+            raise ValueError(f"Неизвестный этап каскада: {stage}")
+        if stage in seen:
+            raise ValueError(f"Этап каскада указан дважды: {stage}")
+        seen.add(stage)
+        top_k = int(item.get('top_k', 0))
+        min_score = float(item.get('min_score', 0.0))
+        if top_k < 1:
+            raise ValueError(f"Число кандидатов этапа {stage} должно быть больше 0")
+        if not 0.0 <= min_score <= 1.0:
+            raise ValueError(f"Порог этапа {stage} должен быть от 0 до 1")
+        result.append({'stage': stage, 'top_k': top_k, 'min_score': min_score})
+    if not result:
+        raise ValueError("Каскад должен содержать хотя бы один этап")
+    result.sort(key=lambda s: STAGES.index(s['stage']))
+    if result[-1]['stage'] not in FINAL_STAGES:
+        raise ValueError("Последним этапом каскада должен быть один из: " +
+                         ', '.join(STAGE_TITLES[stage] for stage in FINAL_STAGES))
+    return result
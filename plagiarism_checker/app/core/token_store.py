@@ -0,0 +1,114 @@
+import zlib
+from typing import Iterable, List, Sequence, Tuple
+import numpy as np
+from app.core.hashing_vectorizer import N_FEATURES
+
+
+class Vocabulary:
+    """
+    Словарь токенов базы: каждому токену присваивается номер int32.
+    Для каждого номера хранится номер хэшированного признака (для TF-IDF).
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.tokens: List[str] = []
+        self._features = np.empty(1024, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @property
+    def features(self) -> np.ndarray:
+        return self._features[:len(self.tokens)]
+
+    def add(self, tokens: Iterable[str]) -> None:
+        for token in tokens:
+            if token in self.ids:
+                continue
+            token_id = len(self.tokens)
+            if token_id == len(self._features):
+                self._features = np.resize(self._features, 2 * token_id)
+            self._features[token_id] = zlib.crc32(token.encode('utf-8')) % N_FEATURES
+            self.ids[token] = token_id
+            self.tokens.append(token)
+
+    def missing(self, tokens: Iterable[str]) -> List[str]:
+        """Токены, которых ещё нет в словаре, в порядке первого появления."""
+        result = []
+        seen = set()
+        for token in tokens:
+            if token not in self.ids and token not in seen:
+                seen.add(token)
+                result.append(token)
+        return result
+
+    def encode(self, tokens: Sequence[str]) -> np.ndarray:
+        """
+        Номера токенов. Неизвестным токенам присваиваются отрицательные
+        номера, которые не совпадают ни с чем в базе; повторы одного
+        неизвестного токена получают один номер (иначе множество токенов
+        запроса, например для меры Жаккара, оказалось бы больше настоящего).
+        """
+        ids = self.ids
+        unknown = {}
+        return np.fromiter((ids[token] if token in ids
+                            else unknown.setdefault(token, -1 - len(unknown))
+                            for token in tokens),
+                           dtype=np.int32, count=len(tokens))
+
+    def decode(self, ids: np.ndarray) -> List[str]:
+        return [self.tokens[i] for i in ids]
+
+
+class TokenStore:
+    """
+    Документы как строки номеров токенов в одном непрерывном массиве int32;
+    строка i занимает tokens[offsets[i]:offsets[i + 1]].
+    Строки только дописываются; освобождённое место возвращает compact().
+    """
+
+    def __init__(self):
+        self._tokens = np.empty(1 << 16, dtype=np.int32)
+        self._offsets = np.zeros(1024, dtype=np.int64)
+        self.rows = 0
+
+    @property
+    def size(self) -> int:
+        return int(self._offsets[self.rows])
+
+    @property
+    def tokens(self) -> np.ndarray:
+        return self._tokens[:self.size]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets[:self.rows + 1]
+
+    @property
+    def nbytes(self) -> int:
+        return self._tokens.nbytes + self._offsets.nbytes
+
+    def append(self, ids: np.ndarray) -> int:
+        start = self.size
+        end = start + len(ids)
+        if end > len(self._tokens):
+            # Умеренный рост: запас не должен съедать выигрыш от int32
+            self._tokens = np.resize(
+                self._tokens, max(end, len(self._tokens) + len(self._tokens) // 4))
+        if self.rows + 2 > len(self._offsets):
+            self._offsets = np.resize(self._offsets, 2 * len(self._offsets))
+        self._tokens[start:end] = ids
+        self.rows += 1
+        self._offsets[self.rows] = end
+        return self.rows - 1
+
+    def row(self, row: int) -> np.ndarray:
+        return self._tokens[self._offsets[row]:self._offsets[row + 1]]
+
+    def compact(self, rows: Sequence[int]) -> Tuple['TokenStore', np.ndarray]:
+        """Новое хранилище только из строк rows и номера строк в нём."""
+        store = TokenStore()
+        mapping = np.array([store.append(self.row(row)) for row in rows],
+                           dtype=np.int64)
+        return store, mapping
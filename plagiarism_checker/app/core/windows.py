@@ -0,0 +1,119 @@
+"""
+Проверка длинных документов по окнам.
+
+Текст предобрабатывается частями и режется на окна по WINDOW_TOKENS
+слов; каждое окно оценивается каскадом, как только оно готово, с
+завершающим этапом выравнивания фрагментов (доля слов окна, входящих
+в общие с источником фрагменты). Сходство документа — среднее сходство
+окон, взвешенное по числу слов. Если после min_windows окон это среднее
+достигло порога stop_similarity, проверка останавливается досрочно:
+остаток документа не предобрабатывается и не сравнивается.
+"""
+import os
+import re
+from typing import Iterator, List, Optional
+from app.core.text_preprocessor import TextPreprocessor
+
+WINDOW_TOKENS = 1000
+# Документы короче (в символах) проверяются целиком
+WINDOWED_MIN_CHARS = 200000
+# Порог досрочной остановки (0 — без остановки) и минимум проверенных окон
+STOP_SIMILARITY = 0.8
+STOP_MIN_WINDOWS = 3
+# Размер части текста для предобработки, символов
+SEGMENT_CHARS = 64 * 1024
+# Этап, добавляемый в каскад для оценки окон
+WINDOW_ALIGNMENT_STAGE = {'stage': 'alignment', 'top_k': 5, 'min_score': 0.0}
+
+_WHITESPACE = re.compile(r'\s')
+
+
+def iter_tokens(text: str, remove_stopwords: bool = True, lemmatize: bool = True,
+                segment_chars: int = SEGMENT_CHARS) -> Iterator[List[str]]:
+    """
+    Предобработанные слова текста частями. Части режутся по пробелам,
+    а предобработка действует на каждое слово отдельно, поэтому
+    результат совпадает с предобработкой всего текста сразу.
+    """
+    start = 0
+    while start < len(text):
+        match = _WHITESPACE.search(text, start + segment_chars)
+        end = match.start() if match else len(text)
+        tokens = TextPreprocessor.preprocess_text(
+            text[start:end], remove_stop=remove_stopwords, lemmatize=lemmatize).split()
+        if tokens:
+            yield tokens
+        start = end + 1
+
+
+def iter_windows(tokens: Iterator[List[str]],
+                 size: int = WINDOW_TOKENS) -> Iterator[List[str]]:
+    """Окна по size слов; короткий (меньше половины окна) хвост присоединяется к последнему окну."""
+    buffer = []
+    pending = None
+    for part in tokens:
+        buffer.extend(part)
+        while len(buffer) >= size:
+            if pending is not None:
+                yield pending
+            pending, buffer = buffer[:size], buffer[size:]
+    if pending is not None and len(buffer) < size // 2:
+        yield pending + buffer
+        return
+    if pending is not None:
+        yield pending
+    if buffer:
+        yield buffer
+
+
+class WindowedResult:
+    def __init__(self):
+        self.similarity = 0.0
+        self.best_path: Optional[str] = None
+        # [начало, конец (в словах), сходство, лучший источник] по окнам
+        self.profile = []
+        self.stopped_early = False
+
+
+def window_cascade(stages: List[dict]) -> List[dict]:
+    """Каскад для окон: с этапом выравнивания в конце."""
+    if any(stage['stage'] == 'alignment' for stage in stages):
+        return stages
+    return list(stages) + [dict(WINDOW_ALIGNMENT_STAGE)]
+
+
+def score_windows(scorer, features, text: str, remove_stopwords: bool = True,
+                  lemmatize: bool = True, size: int = WINDOW_TOKENS,
+                  stop_similarity: float = STOP_SIMILARITY,
+                  min_windows: int = STOP_MIN_WINDOWS,
+                  progress=None) -> WindowedResult:
+    """
+    Оценка документа по окнам каскадом scorer.
+    progress(этап, процент) получает долю обработанного текста.
+    """
+    result = WindowedResult()
+    covered = 0.0
+    best = 0.0
+    position = 0
+    # Оценка числа слов для хода проверки (стоп-слова не вычитаются)
+    total_words = max(1, len(text.split()))
+    windows = iter_windows(iter_tokens(text, remove_stopwords, lemmatize), size)
+    for window in windows:
+        window_result = scorer.score(features, ' '.join(window))
+        start, position = position, position + len(window)
+        source = os.path.basename(window_result.best_path) \
+            if window_result.best_path and window_result.similarity > 0 else None
+        result.profile.append([start, position, round(window_result.similarity, 4), source])
+        covered += window_result.similarity * len(window)
+        if window_result.similarity > best:
+            best = window_result.similarity
+            result.best_path = window_result.best_path
+        result.similarity = covered / position
+        if progress is not None:
+            progress(f'Окно {len(result.profile)}',
+                     30 + 70 * min(1.0, position / total_words))
+        if stop_similarity and len(result.profile) >= min_windows \
+                and result.similarity >= stop_similarity:
+            result.stopped_early = True
+            break
+    return result
@@ -0,0 +1,67 @@
+import threading
+import time
+from typing import Optional
+from flask_login import UserMixin
+
+
+class CachedIdentity(UserMixin):
+    """
+    Пользователь сессии без обращения к базе: только то, что нужно
+    для проверок доступа (номер, роль, имя).
+    """
+
+    def __init__(self, user_id: int, role: str, name: str):
+        self.id = user_id
+        self.role = role
+        self.name = name
+
+
+class IdentityCache:
+    """
+    Кэш пользователей сессий: номер -> (роль, имя) со сроком жизни ttl, с.
+    Изменение пользователя сбрасывает запись только в текущем процессе,
+    в остальных рабочих процессах (serve.py) она устаревает не позже ttl.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+
+    def get(self, user_id: int) -> Optional[CachedIdentity]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return CachedIdentity(user_id, *entry[1:])
+
+    def put(self, user) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                now = time.monotonic()
+                self._entries = {key: entry for key, entry in self._entries.items()
+                                 if entry[0] >= now}
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+            self._entries[user.id] = (time.monotonic() + self.ttl, user.role, user.name)
+
+    def invalidate(self, user_id: int = None) -> None:
+        """Сброс записи пользователя (или всего кэша)."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,145 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from flask import current_app
+
+class Job:
+    """
+    Фоновая задача и её прогресс.
+    """
+
+    def __init__(self, registry: 'JobRegistry', name: str, title: str,
+                 owner_id: int = None, key=None):
+        self.registry = registry
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.title = title
+        self.owner_id = owner_id
+        # Объект, к которому относится задача (например, номер документа)
+        self.key = key
+        # pending, running, completed, error
+        self.status = 'pending'
+        self.stage = ''
+        self.progress = 0
+        self.message = ''
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('pending', 'running')
+
+    def update(self, stage: str = None, progress: float = None,
+               message: str = None) -> None:
+        """Обновление прогресса с уведомлением ожидающих потоков."""
+        with self.registry.changed:
+            if stage is not None:
+                self.stage = stage
+            if progress is not None:
+                self.progress = max(0, min(100, int(progress)))
+            if message is not None:
+                self.message = message
+            self.registry.changed.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'title': self.title,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'message': self.message,
+        }
+
+
+class JobRegistry:
+    """
+    Реестр фоновых задач процесса.
+    Задачи выполняются в отдельных потоках внутри контекста приложения.
+    """
+
+    def __init__(self, max_finished: int = 100):
+        self.max_finished = max_finished
+        self.changed = threading.Condition()
+        self._jobs = OrderedDict()
+
+    def submit(self, name: str, func, *args, title: str = None,
+               exclusive: bool = False, owner_id: int = None, key=None,
+               **kwargs) -> Job:
+        """
+        Запуск func(job, *args, **kwargs) в фоновом потоке.
+        При exclusive=True уже выполняющаяся задача с тем же именем
+        возвращается вместо запуска новой.
+        """
+        app = current_app._get_current_object()
+        with self.changed:
+            if exclusive:
+                for job in self._jobs.values():
+                    if job.name == name and job.active:
+                        return job
+            job = Job(self, name, title or name, owner_id, key)
+            self._jobs[job.id] = job
+            self._trim()
+
+        thread = threading.Thread(
+            target=self._run, args=(app, job, func, args, kwargs),
+            name=f'job-{name}', daemon=True)
+        thread.start()
+        return job
+
+    def _run(self, app, job: Job, func, args, kwargs) -> None:
+        from app import db
+        with app.app_context():
+            self._set_status(job, 'running')
+            try:
+                job.result = func(job, *args, **kwargs)
+                self._set_status(job, 'completed', progress=100)
+            except Exception as e:
+                app.logger.error('Фоновая задача %s завершилась ошибкой:\n%s',
+                                 job.name, traceback.format_exc())
+                self._set_status(job, 'error', message=str(e))
+            finally:
+                db.session.remove()
+
+    def _set_status(self, job: Job, status: str, progress: int = None,
+                    message: str = None) -> None:
+        with self.changed:
+            job.status = status
+            if progress is not None:
+                job.progress = progress
+            if message is not None:
+                job.message = message
+            if status in ('completed', 'error'):
+                job.finished = time.time()
+            self.changed.notify_all()
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def find(self, name: str, key):
+        """Последняя задача name для объекта key."""
+        with self.changed:
+            for job in reversed(self._jobs.values()):
+                if job.name == name and job.key == key:
+                    return job
+        return None
+
+    def recent(self, names=None, limit: int = 10):
+        """Последние задачи (новые первыми), при необходимости по списку имён."""
+        with self.changed:
+            jobs = [job for job in reversed(self._jobs.values())
+                    if names is None or job.name in names]
+        return jobs[:limit]
+
+
+jobs = JobRegistry()
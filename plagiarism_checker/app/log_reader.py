@@ -0,0 +1,229 @@
+"""
+Чтение больших файлов журнала приложения без загрузки в память.
+
+Файл отображается в память (mmap), а для перехода по времени строится
+разреженный индекс: через каждые INDEX_STRIDE байт запоминается смещение
+начала ближайшей записи и её время. Переход к моменту времени — бинарный
+поиск по индексу и просмотр не больше INDEX_STRIDE байт. Индекс
+достраивается по мере роста файла и строится заново, если файл заменён
+(ротация) или укорочен.
+
+Запись — строка, начинающаяся со времени (формат LOG_FORMAT), вместе со
+следующими строками без времени (трассировки исключений).
+"""
+import bisect
+import mmap
+import os
+import re
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+# Шаг разреженного индекса, байт
+INDEX_STRIDE = 1024 * 1024
+# Сколько байт просматривает один запрос с фильтром, прежде чем вернуть
+# неполную страницу (продолжение — со смещения next_offset)
+SCAN_LIMIT = 64 * 1024 * 1024
+# Длина текста записи, показываемая целиком, символов
+MAX_RECORD_CHARS = 10000
+
+_RECORD_START = re.compile(
+    rb'(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)(?:,\d+)? ([A-Z]+) ')
+
+
+class LogRecord:
+    def __init__(self, offset: int, time: Optional[datetime], level: str, text: str):
+        self.offset = offset
+        self.time = time
+        self.level = level
+        self.text = text
+
+
+class LogPage:
+    def __init__(self, records: List[LogRecord], next_offset: int, end: int):
+        self.records = records
+        # Откуда продолжать чтение; равно end, если файл дочитан
+        self.next_offset = next_offset
+        self.end = end
+
+    @property
+    def complete(self) -> bool:
+        return self.next_offset >= self.end
+
+
+def _parse_time(raw: bytes) -> datetime:
+    return datetime.strptime(raw.decode('ascii'), '%Y-%m-%d %H:%M:%S')
+
+
+class LogFile:
+    """Журнал на диске с разреженным индексом смещений и времени."""
+
+    def __init__(self, path: str, stride: int = INDEX_STRIDE):
+        self.path = path
+        self.stride = stride
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode) -> None:
+        self._inode = inode
+        # Смещения начала записей и их время, по возрастанию
+        self._offsets: List[int] = []
+        self._times: List[datetime] = []
+        # С какого смещения искать следующую точку индекса
+        self._indexed = 0
+        self._size = 0
+
+    def _open(self) -> Tuple[Optional[mmap.mmap], int]:
+        """Отображение файла в память и его текущий размер (None для пустого файла)."""
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            with self._lock:
+                if stat.st_ino != self._inode or stat.st_size < self._size:
+                    self._reset(stat.st_ino)
+                self._size = stat.st_size
+            if stat.st_size == 0:
+                return None, 0
+            return mmap.mmap(f.fileno(), stat.st_size, access=mmap.ACCESS_READ), stat.st_size
+
+    @staticmethod
+    def _next_record(mm: mmap.mmap, pos: int, end: int) -> int:
+        """Начало первой записи не раньше pos (или end)."""
+        if pos > 0 and mm[pos - 1:pos] != b'\n':
+            pos = mm.find(b'\n', pos, end)
+            if pos < 0:
+                return end
+            pos += 1
+        while pos < end and not _RECORD_START.match(mm, pos, min(end, pos + 64)):
+            pos = mm.find(b'\n', pos, end)
+            if pos < 0:
+                return end
+            pos += 1
+        return pos
+
+    def _record_end(self, mm: mmap.mmap, start: int, end: int) -> int:
+        line_end = mm.find(b'\n', start, end)
+        if line_end < 0:
+            return end
+        return self._next_record(mm, line_end + 1, end)
+
+    def _record(self, mm: mmap.mmap, start: int, stop: int) -> LogRecord:
+        match = _RECORD_START.match(mm, start, min(stop, start + 64))
+        raw = mm[start:min(stop, start + MAX_RECORD_CHARS * 4)]
+        text = raw.decode('utf-8', errors='replace').rstrip('\n')
+        if len(text) > MAX_RECORD_CHARS or stop - start > len(raw):
+            text = text[:MAX_RECORD_CHARS] + ' …'
+        if match is None:
+            return LogRecord(start, None, '', text)
+        return LogRecord(start, _parse_time(match.group(1)),
+                         match.group(2).decode('ascii'), text)
+
+    def _extend_index(self, mm: mmap.mmap, size: int) -> None:
+        """Добавление в индекс точек для выросшей части файла."""
+        with self._lock:
+            pos = self._indexed
+            while pos < size:
+                start = self._next_record(mm, pos, size)
+                if start >= size:
+                    break
+                if not self._offsets or start > self._offsets[-1]:
+                    match = _RECORD_START.match(mm, start, min(size, start + 64))
+                    self._offsets.append(start)
+                    self._times.append(_parse_time(match.group(1)))
+                pos = start + self.stride
+            # Следующая точка — не раньше чем через шаг от последней
+            self._indexed = pos
+
+    def seek_time(self, moment: datetime) -> int:
+        """Смещение первой записи не раньше moment (или конец файла)."""
+        mm, size = self._open()
+        if mm is None:
+            return 0
+        with mm:
+            self._extend_index(mm, size)
+            point = bisect.bisect_left(self._times, moment) - 1
+            pos = self._offsets[point] if point >= 0 else 0
+            pos = self._next_record(mm, pos, size)
+            while pos < size:
+                match = _RECORD_START.match(mm, pos, min(size, pos + 64))
+                if _parse_time(match.group(1)) >= moment:
+                    return pos
+                pos = self._record_end(mm, pos, size)
+            return size
+
+    def read(self, offset: int = 0, limit: int = 100, levels=None,
+             text: str = None, until: datetime = None,
+             scan_limit: int = SCAN_LIMIT) -> LogPage:
+        """
+        Страница записей начиная с offset, подходящих под фильтр: уровни,
+        подстрока (без учёта регистра) и время до until. Просмотр
+        ограничен scan_limit байт — тогда страница может быть неполной.
+        """
+        mm, size = self._open()
+        if mm is None:
+            return LogPage([], 0, 0)
+        needle = text.lower() if text else None
+        records = []
+        with mm:
+            pos = self._next_record(mm, min(offset, size), size)
+            scan_end = min(size, pos + scan_limit)
+            while pos < size and len(records) < limit and pos < scan_end:
+                stop = self._record_end(mm, pos, size)
+                match = _RECORD_START.match(mm, pos, min(size, pos + 64))
+                if until is not None and match and _parse_time(match.group(1)) >= until:
+                    return LogPage(records, size, size)
+                level = match.group(2).decode('ascii') if match else ''
+                if (not levels or level in levels) and \
+                        (needle is None or
+                         needle in mm[pos:stop].decode('utf-8', errors='replace').lower()):
+                    records.append(self._record(mm, pos, stop))
+                pos = stop
+        return LogPage(records, pos, size)
+
+    def tail(self, limit: int = 100) -> LogPage:
+        """Последние limit записей; читается только конец файла."""
+        mm, size = self._open()
+        if mm is None:
+            return LogPage([], 0, 0)
+        with mm:
+            block = 64 * 1024
+            while True:
+                start = self._next_record(mm, max(0, size - block), size)
+                starts = []
+                pos = start
+                while pos < size:
+                    starts.append(pos)
+                    pos = self._record_end(mm, pos, size)
+                if len(starts) >= limit or block >= size:
+                    break
+                block *= 4
+            starts = starts[-limit:]
+            records = [self._record(mm, begin, stop)
+                       for begin, stop in zip(starts, starts[1:] + [size])]
+        return LogPage(records, size, size)
+
+
+class LogDirectory:
+    """Файлы журнала в каталоге; объекты LogFile (с индексами) переиспользуются."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        if not os.path.isdir(self.folder):
+            return []
+        names = [name for name in os.listdir(self.folder)
+                 if name.endswith('.log') or
+                 ('.log.' in name and not name.endswith('.gz'))]
+        return sorted(names, key=lambda name: (len(name), name))
+
+    def get(self, name: str) -> Optional[LogFile]:
+        if name not in self.names():
+            return None
+        with self._lock:
+            if name not in self._files:
+                self._files[name] = LogFile(os.path.join(self.folder, name))
+            return self._files[name]
@@ -1,3 +1,4 @@
+import json
 from app import login_manager
 from flask_login import UserMixin
 from app import db
@@ -25,6 +26,15 @@ class SourceDocument(db.Model):
     # pdf, docx, txt
     format = db.Column(db.String(10), nullable=False)
     size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), index=True)
+    # Итог фоновой проверки: queued, completed, error (текст — в check_error);
+    # сохраняется в базе, потому что задача живёт только в памяти процесса
+    check_status = db.Column(db.String(20))
+    check_error = db.Column(db.String(500))
+    # Ход проверки для других рабочих процессов и время последней отметки
+    check_stage = db.Column(db.String(100))
+    check_progress = db.Column(db.Integer)
+    check_updated = db.Column(db.DateTime)
     upload_date = db.Column(db.DateTime, default=db.func.current_timestamp())
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
@@ -56,10 +66,29 @@ class PlagiarismCheck(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     check_date = db.Column(db.DateTime, default=db.func.current_timestamp())
     uniqueness_percentage = db.Column(db.Float)
+    # Версия индекса базы, с которой сравнивался документ (см. CorpusIndex),
+    # и лучшее найденное совпадение; обновляются задачей пересчёта
+    corpus_version = db.Column(db.BigInteger)
+    best_similarity = db.Column(db.Float)
+    best_source = db.Column(db.String(255))
+    # JSON: сходство по окнам длинного документа (см. app.core.windows)
+    window_profile = db.Column(db.Text)
+    # Разделы базы, с которыми сравнивался документ, через запятую
+    # (NULL — проверка до появления разделов, только общая база)
+    partitions = db.Column(db.String(500))
 
     processed_text = db.relationship('ProcessedText', back_populates='checks')
     report = db.relationship('Report', back_populates='check', uselist=False)
 
+    @property
+    def profile(self):
+        """{'windows': [[начало, конец, сходство, источник], ...], 'stopped_early': bool} или None."""
+        return json.loads(self.window_profile) if self.window_profile else None
+
+    @property
+    def partition_names(self):
+        return self.partitions.split(',') if self.partitions else []
+
 
 class Report(db.Model):
     __tablename__ = 'reports'
@@ -70,11 +99,68 @@ class Report(db.Model):
     generated_date = db.Column(
         db.DateTime, default=db.func.current_timestamp())
     uniqueness_percentage = db.Column(db.Float)
+    # Оценка преподавателя (2–5)
+    grade = db.Column(db.Integer)
 
     user = db.relationship('User', back_populates='reports')
     check = db.relationship('PlagiarismCheck', back_populates='report')
 
 
+class ReportStat(db.Model):
+    """
+    Сводка отчётов: число и сумма процентов уникальности по пользователю,
+    месяцу и интервалу гистограммы. Обновляется в транзакции вставки отчёта.
+    """
+    __tablename__ = 'report_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    # ГГГГ-ММ
+    period = db.Column(db.String(7), primary_key=True)
+    # Номер интервала уникальности шириной STAT_BUCKET_WIDTH процентов
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+
+    user = db.relationship('User')
+
+
+class AuditEvent(db.Model):
+    """Событие журнала аудита или оповещение (уровни warning, error)."""
+    __tablename__ = 'audit_events'
+    id = db.Column(db.Integer, primary_key=True)
+    # UTC; индексы по времени — для выборок за период, в том числе по пользователю и уровню
+    created = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    action = db.Column(db.String(32), nullable=False)
+    # info, warning, error
+    level = db.Column(db.String(10), nullable=False, default='info')
+    message = db.Column(db.String(500), nullable=False, default='')
+    address = db.Column(db.String(45))
+
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.Index('ix_audit_events_created', 'created'),
+        db.Index('ix_audit_events_user_created', 'user_id', 'created'),
+        db.Index('ix_audit_events_level_created', 'level', 'created'),
+    )
+
+
+class SystemSetting(db.Model):
+    __tablename__ = 'system_settings'
+    key = db.Column(db.String(64), primary_key=True)
+    # JSON
+    value = db.Column(db.Text, nullable=False)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Роль и имя берутся из кэша; в базу идёт только промах
+    from app.identity import identity_cache
+    user_id = int(user_id)
+    identity = identity_cache.get(user_id)
+    if identity is not None:
+        return identity
+    user = db.session.get(User, user_id)
+    if user is not None:
+        identity_cache.put(user)
+    return user
@@ -0,0 +1,127 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from config import DB_FOLDER, INDEX_FOLDER
+
+# Общий раздел — сама база DB_FOLDER (справочные источники и прежние работы)
+GLOBAL_PARTITION = 'global'
+PARTITION_TITLES = {GLOBAL_PARTITION: 'Общая база'}
+# Имя раздела: например, course-ml-2026 или assignment-lab3
+_PARTITION_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+
+class CorpusPartitions:
+    """
+    Именованные разделы базы источников (курс, задание, общая база).
+    Документы раздела лежат в подкаталоге DB_FOLDER, индекс — в подкаталоге
+    INDEX_FOLDER с тем же именем; общий раздел — сами DB_FOLDER и INDEX_FOLDER
+    (индекс общей базы подкаталоги не читает). Индексы разделов загружаются
+    в кэш процесса при первой проверке и вытесняются давно не использованные
+    (CORPUS_CACHED_INDEXES); общий раздел не вытесняется.
+    """
+
+    def __init__(self, database_dir: str, index_dir: str):
+        self.database_dir = database_dir
+        self.index_dir = index_dir
+        self.cached_indexes = None
+
+    def init_app(self, app) -> None:
+        # Кэш индексов настраивается при первом обращении к разделам:
+        # модуль индекса (и numpy) не загружается при создании приложения
+        self.cached_indexes = app.config['CORPUS_CACHED_INDEXES']
+
+    def _configure_cache(self) -> None:
+        if self.cached_indexes is None:
+            return
+        from app.core.corpus_index import configure_index_cache
+        configure_index_cache(self.cached_indexes, pinned=[self.dirs(GLOBAL_PARTITION)])
+        self.cached_indexes = None
+
+    def names(self) -> List[str]:
+        """Разделы по имени; общий — последним."""
+        names = []
+        if os.path.isdir(self.database_dir):
+            with os.scandir(self.database_dir) as it:
+                names = sorted(item.name for item in it if item.is_dir()
+                               and _PARTITION_NAME.match(item.name)
+                               and item.name != GLOBAL_PARTITION)
+        return names + [GLOBAL_PARTITION]
+
+    def dirs(self, name: str) -> Tuple[str, str]:
+        """(каталог документов, каталог индекса) раздела."""
+        if name == GLOBAL_PARTITION:
+            return self.database_dir, self.index_dir
+        return (os.path.join(self.database_dir, name),
+                os.path.join(self.index_dir, name))
+
+    def create(self, name: str) -> None:
+        if not _PARTITION_NAME.match(name) or name == GLOBAL_PARTITION:
+            raise ValueError('Имя раздела: строчные латинские буквы, цифры, «-» и «_»')
+        if name in self.names():
+            raise ValueError('Раздел уже существует')
+        for folder in self.dirs(name):
+            os.makedirs(folder, exist_ok=True)
+
+    def select(self, names: List[str]) -> Dict[str, Tuple[str, str]]:
+        """Существующие разделы из names (порядок сохраняется); по умолчанию — общий."""
+        self._configure_cache()
+        existing = set(self.names())
+        selected = {name: self.dirs(name) for name in dict.fromkeys(names)
+                    if name in existing}
+        return selected or {GLOBAL_PARTITION: self.dirs(GLOBAL_PARTITION)}
+
+    def corpus_path(self, name: str, filename: str) -> str:
+        """Путь, по которому проверенная работа добавляется в раздел."""
+        return os.path.join(self.dirs(name)[0], filename)
+
+    def load(self, name: str):
+        """Загрузка индекса раздела в память вместе с признаками документов."""
+        from app.core.cascade import corpus_features
+        from app.core.corpus_index import get_corpus_index
+        self._configure_cache()
+        index = get_corpus_index(*self.dirs(name), refresh=True)
+        corpus_features(index)
+        return index
+
+    def unload(self, name: str) -> None:
+        from app.core.corpus_index import drop_cached_index
+        drop_cached_index(*self.dirs(name))
+
+    def status(self) -> List[dict]:
+        """Разделы: число файлов на диске и состояние в памяти процесса."""
+        from app.core.corpus_index import cached_index
+        from app.core.plagiarism_check import supported_extensions
+
+        extensions = set(supported_extensions())
+        result = []
+        for name in self.names():
+            folder = self.dirs(name)[0]
+            files = 0
+            if os.path.isdir(folder):
+                with os.scandir(folder) as it:
+                    files = sum(1 for item in it if item.is_file() and
+                                os.path.splitext(item.name)[1].lower() in extensions)
+            index = cached_index(*self.dirs(name))
+            result.append({'name': name, 'title': PARTITION_TITLES.get(name, name),
+                           'files': files, 'loaded': index is not None,
+                           'documents': len(index.entries) if index is not None else None})
+        return result
+
+    def source_tokens(self, source: str) -> Optional[List[str]]:
+        """
+        Предобработанный текст источника из отчёта (PlagiarismCheck.best_source:
+        имя файла общей базы или «раздел/имя файла»), None, если его нет в индексе.
+        """
+        partition, _, name = source.rpartition('/')
+        if partition and partition not in self.names():
+            return None
+        from app.core.corpus_index import get_corpus_index
+        self._configure_cache()
+        index = get_corpus_index(*self.dirs(partition or GLOBAL_PARTITION), refresh=False)
+        entry = index.entries.get(name)
+        if entry is None or entry['error'] is not None:
+            return None
+        return index.text(name).split()
+
+
+partitions = CorpusPartitions(DB_FOLDER, INDEX_FOLDER)
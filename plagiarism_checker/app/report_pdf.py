@@ -0,0 +1,191 @@
+"""
+Отчёт о проверке в PDF: сведения о проверке, сходство по окнам и текст
+документа с выделенными фрагментами, общими с найденными источниками.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+from importlib.util import find_spec
+from typing import List, Optional, Sequence, Tuple
+from app.core.text_preprocessor import TextPreprocessor
+
+REPORTLAB_AVAILABLE = find_spec('reportlab') is not None
+
+# Меняется при изменении оформления, чтобы старые файлы создавались заново
+PDF_LAYOUT_VERSION = 1
+# Сколько символов текста документа попадает в PDF
+PDF_TEXT_LIMIT = 300000
+# Сколько источников (лучший и из профиля окон) используется для выделения
+PDF_HIGHLIGHT_SOURCES = 5
+PDF_HIGHLIGHT_COLOR = '#ffd6d6'
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/local/share/fonts/DejaVuSans.ttf',
+    '/Library/Fonts/DejaVuSans.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+)
+FONT_NAME = 'ReportFont'
+
+
+def report_version(report) -> str:
+    """Версия содержимого отчёта: меняется при любом изменении того, что попадает в PDF."""
+    check = report.check
+    content = [PDF_LAYOUT_VERSION, report.id, report.uniqueness_percentage, report.grade,
+               str(report.generated_date)]
+    if check is not None:
+        content += [check.id, check.corpus_version, check.best_similarity,
+                    check.best_source, check.window_profile]
+    return hashlib.sha1(json.dumps(content).encode('utf-8')).hexdigest()[:16]
+
+
+def highlight_spans(text: str, sources: Sequence[Sequence[str]],
+                    remove_stopwords: bool = True,
+                    lemmatize: bool = True) -> List[Tuple[int, int]]:
+    """
+    Диапазоны символов text, входящие в общие с источниками фрагменты.
+    Каждое слово (до пробела) предобрабатывается отдельно и даёт не больше
+    одного токена, поэтому фрагменты токенов переводятся в позиции текста.
+    """
+    from app.core.cascade import shared_passages
+
+    words = list(re.finditer(r'\S+', text))
+    processed = {}
+    tokens, owners = [], []
+    for number, word in enumerate(words):
+        raw = word.group()
+        token = processed.get(raw)
+        if token is None:
+            token = processed[raw] = TextPreprocessor.preprocess_text(
+                raw, remove_stop=remove_stopwords, lemmatize=lemmatize)
+        if token:
+            tokens.append(token)
+            owners.append(number)
+    covered = []
+    for source in sources:
+        covered += shared_passages(tokens, source)
+    spans = []
+    for start, end in sorted(covered):
+        span = [words[owners[start]].start(), words[owners[end - 1]].end()]
+        if spans and spans[-1][1] >= span[0]:
+            spans[-1][1] = max(spans[-1][1], span[1])
+        else:
+            spans.append(span)
+    return [tuple(span) for span in spans]
+
+
+def _find_font(path: str = '') -> Optional[str]:
+    for candidate in (path,) + FONT_CANDIDATES:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _markup(text: str, start: int, end: int, spans: List[Tuple[int, int]],
+            first: int = 0) -> str:
+    """
+    Разметка абзаца text[start:end] с выделением пересекающихся с ним
+    диапазонов; диапазоны до spans[first] заканчиваются раньше абзаца.
+    """
+    from xml.sax.saxutils import escape
+    parts = []
+    position = start
+    for number in range(first, len(spans)):
+        span_start, span_end = spans[number]
+        if span_start >= end:
+            break
+        if span_end <= start:
+            continue
+        span_start, span_end = max(span_start, start), min(span_end, end)
+        parts.append(escape(text[position:span_start]))
+        parts.append(f'<font backColor="{PDF_HIGHLIGHT_COLOR}">'
+                     f'{escape(text[span_start:span_end])}</font>')
+        position = span_end
+    parts.append(escape(text[position:end]))
+    return ''.join(parts)
+
+
+def render_report_pdf(report, text: str, spans: List[Tuple[int, int]],
+                      font_path: str = '') -> bytes:
+    """PDF отчёта; spans — выделяемые диапазоны text (см. highlight_spans)."""
+    from bisect import bisect_left
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    font = _find_font(font_path)
+    if font is None:
+        raise RuntimeError('Не найден шрифт с кириллицей (задайте PDF_FONT_PATH)')
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, font))
+
+    styles = getSampleStyleSheet()
+    heading = ParagraphStyle('ReportHeading', parent=styles['Heading2'], fontName=FONT_NAME)
+    body = ParagraphStyle('ReportBody', parent=styles['BodyText'], fontName=FONT_NAME,
+                          fontSize=10, leading=14)
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+    check = report.check
+    document = check.processed_text.document if check else None
+    rows = [
+        ['Документ', document.filename if document else '—'],
+        ['Автор', report.user.name],
+        ['Дата проверки', report.generated_date.strftime('%Y-%m-%d %H:%M')
+         if report.generated_date else '—'],
+        ['Уникальность', f'{report.uniqueness_percentage:.1f}%'
+         if report.uniqueness_percentage is not None else '—'],
+    ]
+    if check is not None and check.best_source:
+        rows.append(['Ближайший источник',
+                     f'{check.best_source} ({check.best_similarity * 100:.1f}%)'])
+    if report.grade is not None:
+        rows.append(['Оценка', str(report.grade)])
+
+    story = [Paragraph('Отчёт о проверке на заимствования', heading),
+             Table(rows, colWidths=[4.5 * cm, 12 * cm], style=table_style)]
+
+    profile = check.profile if check is not None else None
+    if profile:
+        story += [Spacer(1, 0.4 * cm), Paragraph('Сходство по фрагментам', heading)]
+        windows = [['Слова', 'Сходство', 'Источник']] + [
+            [f'{start}–{end}', f'{similarity * 100:.0f}%', source or '—']
+            for start, end, similarity, source in profile['windows']]
+        story.append(Table(windows, colWidths=[3.5 * cm, 2.5 * cm, 10.5 * cm],
+                           style=table_style, repeatRows=1))
+        if profile.get('stopped_early'):
+            story.append(Paragraph('Проверка остановлена досрочно: '
+                                   'сходство проверенной части достигло порога.', body))
+
+    story += [Spacer(1, 0.4 * cm), Paragraph('Текст документа', heading)]
+    if spans:
+        story.append(Paragraph(
+            f'<font backColor="{PDF_HIGHLIGHT_COLOR}">Выделены</font> фрагменты, '
+            'совпадающие с источниками.', body))
+    shown = text[:PDF_TEXT_LIMIT]
+    span_ends = [end for _, end in spans]
+    for paragraph in re.finditer(r'[^\n]+', shown):
+        start, end = paragraph.span()
+        if not paragraph.group().strip():
+            continue
+        first = bisect_left(span_ends, start + 1)
+        story.append(Paragraph(_markup(shown, start, end, spans, first), body))
+    if len(text) > PDF_TEXT_LIMIT:
+        story.append(Paragraph(f'… текст сокращён до {PDF_TEXT_LIMIT} символов '
+                               f'из {len(text)}.', body))
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title=f'Отчёт {report.id}',
+                      leftMargin=2 * cm, rightMargin=2 * cm,
+                      topMargin=2 * cm, bottomMargin=2 * cm).build(story)
+    return buffer.getvalue()
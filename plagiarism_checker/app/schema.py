@@ -0,0 +1,54 @@
+"""
+Создание и обновление схемы базы данных.
+
+db.create_all() создаёт только отсутствующие таблицы, поэтому столбцы,
+добавленные в модели позже (например, PlagiarismCheck.corpus_version),
+в существующих таблицах не появляются. init_schema() дополнительно
+добавляет такие столбцы (ALTER TABLE ... ADD COLUMN) и их индексы;
+повторный запуск ничего не меняет.
+"""
+from typing import List
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+from app import db
+
+
+def _add_column_sql(table, column) -> str:
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    column_type = column.type.compile(dialect=dialect)
+    return (f'ALTER TABLE {preparer.format_table(table)} '
+            f'ADD COLUMN {preparer.format_column(column)} {column_type}')
+
+
+def upgrade_schema() -> List[str]:
+    """Добавление недостающих столбцов существующих таблиц; возвращает их список."""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing = [column for column in table.columns if column.name not in existing]
+            for column in missing:
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(
+                        f'Столбец {table.name}.{column.name} без значения по умолчанию '
+                        'нельзя добавить в существующую таблицу')
+                connection.exec_driver_sql(_add_column_sql(table, column))
+                added.append(f'{table.name}.{column.name}')
+            if not missing:
+                continue
+            names = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in names:
+                    connection.execute(CreateIndex(index))
+    return added
+
+
+def init_schema() -> List[str]:
+    """Создание отсутствующих таблиц и столбцов; возвращает добавленные столбцы."""
+    db.create_all()
+    return upgrade_schema()
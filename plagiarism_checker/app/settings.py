@@ -0,0 +1,51 @@
+import json
+from flask import current_app
+from app import db
+from app.models import SystemSetting
+
+CASCADE_SETTING = 'cascade'
+
+
+def get_setting(key, default=None):
+    setting = db.session.get(SystemSetting, key)
+    if setting is None:
+        return default
+    return json.loads(setting.value)
+
+
+def set_setting(key, value):
+    setting = db.session.get(SystemSetting, key)
+    if setting is None:
+        setting = SystemSetting(key=key)
+        db.session.add(setting)
+    setting.value = json.dumps(value, ensure_ascii=False)
+    db.session.commit()
+
+
+def get_cascade_settings():
+    from app.core.stages import DEFAULT_CASCADE, validate_cascade
+    stages = get_setting(CASCADE_SETTING)
+    if stages is None:
+        return [dict(stage) for stage in DEFAULT_CASCADE]
+    try:
+        return validate_cascade(stages)
+    except ValueError:
+        return [dict(stage) for stage in DEFAULT_CASCADE]
+
+
+def save_cascade_settings(stages):
+    from app.core.stages import validate_cascade
+    set_setting(CASCADE_SETTING, validate_cascade(stages))
+
+
+def get_window_settings():
+    """Настройки проверки длинных документов по окнам или None, если она выключена."""
+    config = current_app.config
+    if config['CHECK_WINDOW_TOKENS'] <= 0:
+        return None
+    return {
+        'size': config['CHECK_WINDOW_TOKENS'],
+        'min_chars': config['CHECK_WINDOWED_MIN_CHARS'],
+        'stop_similarity': config['CHECK_WINDOW_STOP_SIMILARITY'],
+        'min_windows': config['CHECK_WINDOW_STOP_MIN_WINDOWS'],
+    }
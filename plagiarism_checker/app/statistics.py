@@ -0,0 +1,114 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Report, ReportStat, User
+
+# Гистограмма уникальности: интервалы по STAT_BUCKET_WIDTH процентов
+STAT_BUCKET_WIDTH = 10
+STAT_BUCKETS = 100 // STAT_BUCKET_WIDTH
+
+
+def stat_bucket(uniqueness: float) -> int:
+    return min(STAT_BUCKETS - 1, max(0, int(uniqueness // STAT_BUCKET_WIDTH)))
+
+
+def stat_period(date: datetime = None) -> str:
+    """Период сводки (ГГГГ-ММ); для ещё не вставленного отчёта — текущий."""
+    return (date or datetime.now(timezone.utc)).strftime('%Y-%m')
+
+
+def _stat_key(user_id: int, period: str, bucket: int):
+    return (ReportStat.user_id == user_id, ReportStat.period == period,
+            ReportStat.bucket == bucket)
+
+
+def _add(user_id: int, period: str, bucket: int, count: int, total: float) -> None:
+    """Приращение строки сводки в текущей транзакции."""
+    update = db.update(ReportStat).where(*_stat_key(user_id, period, bucket)).values(
+        count=ReportStat.count + count, total=ReportStat.total + total)
+    if db.session.execute(update).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ReportStat(user_id=user_id, period=period, bucket=bucket,
+                                      count=count, total=total))
+    except IntegrityError:
+        # Строку одновременно вставил другой процесс
+        db.session.execute(update)
+
+
+def record_report(report: Report, previous: float = None) -> None:
+    """
+    Учёт отчёта в сводке. Вызывается до фиксации транзакции, в которой
+    отчёт вставляется или меняется; previous — прежний процент уникальности.
+    """
+    period = stat_period(report.generated_date)
+    if previous is not None:
+        _add(report.user_id, period, stat_bucket(previous), -1, -previous)
+    if report.uniqueness_percentage is not None:
+        _add(report.user_id, period, stat_bucket(report.uniqueness_percentage),
+             1, report.uniqueness_percentage)
+
+
+def rebuild_report_stats() -> int:
+    """Пересчёт сводки по всей таблице отчётов. Возвращает число отчётов."""
+    totals = defaultdict(lambda: [0, 0.0])
+    reports = 0
+    query = db.session.query(Report.user_id, Report.generated_date,
+                             Report.uniqueness_percentage).filter(
+        Report.uniqueness_percentage.isnot(None))
+    for user_id, date, uniqueness in query.yield_per(1000):
+        row = totals[(user_id, stat_period(date), stat_bucket(uniqueness))]
+        row[0] += 1
+        row[1] += uniqueness
+        reports += 1
+    db.session.execute(db.delete(ReportStat))
+    db.session.add_all(
+        ReportStat(user_id=user_id, period=period, bucket=bucket,
+                   count=count, total=total)
+        for (user_id, period, bucket), (count, total) in totals.items())
+    db.session.commit()
+    return reports
+
+
+class _Summary:
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.total = 0.0
+        self.histogram = [0] * STAT_BUCKETS
+
+    def add(self, stat: ReportStat) -> None:
+        self.count += stat.count
+        self.total += stat.total
+        self.histogram[stat.bucket] += stat.count
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+def report_statistics() -> dict:
+    """
+    Распределения уникальности работ студентов: всего, по месяцам и по
+    студентам; проверки загрузок преподавателей не учитываются.
+    Читается только сводка, размер которой не зависит от числа отчётов.
+    """
+    overall = _Summary('Все отчёты')
+    periods = {}
+    users = {}
+    for stat, name in db.session.query(ReportStat, User.name).join(User).filter(
+            User.role == 'student'):
+        if stat.count <= 0:
+            continue
+        overall.add(stat)
+        periods.setdefault(stat.period, _Summary(stat.period)).add(stat)
+        users.setdefault(stat.user_id, _Summary(name)).add(stat)
+    return {
+        'overall': overall,
+        'periods': [periods[key] for key in sorted(periods, reverse=True)],
+        'users': sorted(users.values(), key=lambda summary: summary.label),
+        'buckets': [(i * STAT_BUCKET_WIDTH, (i + 1) * STAT_BUCKET_WIDTH)
+                    for i in range(STAT_BUCKETS)],
+    }
@@ -1,13 +1,34 @@
+import json
 import os
-import shutil
-from flask import render_template, request, redirect, url_for, flash
+import time
+from datetime import datetime, timezone
+from flask import (Response, current_app, render_template, request, redirect, url_for,
+                   flash, send_file)
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app import db
 from app.models import SourceDocument, Report, ProcessedText, PlagiarismCheck
 from app.student import bp
-from app.student.services import allowed_file, simulate_preprocessing, simulate_analysis
-from config import UPLOAD_FOLDER, DB_FOLDER
+from app.student.services import allowed_file, run_check, export_report_pdf
+from app.artifacts import artifacts
+from app.report_pdf import report_version, REPORTLAB_AVAILABLE
+from app.admission import admission, AdmissionRejected
+from app.core.stages import ENGINES
+from app.audit import audit
+from app.jobs import jobs
+from app.partitions import partitions, PARTITION_TITLES, GLOBAL_PARTITION
+from app.uploads import save_upload
+from config import UPLOAD_FOLDER
+
+# Поток событий закрывается через STATUS_STREAM_TIMEOUT с (браузер
+# переподключится сам); пока ход не меняется, раз в STATUS_KEEPALIVE с
+# отправляется комментарий, чтобы прокси не закрыли соединение.
+# Если задача в другом процессе, ход берётся из отметки в документе и браузеру
+# предлагается повтор через STATUS_RETRY мс; проверка считается потерянной,
+# только когда отметка старше CHECK_STALE_AFTER
+STATUS_STREAM_TIMEOUT = 120
+STATUS_KEEPALIVE = 15
+STATUS_RETRY = 2000
 
 
 @bp.route('/dashboard')
@@ -34,33 +55,51 @@ def upload():
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             filepath = os.path.join(UPLOAD_FOLDER, filename)
-            filepath_db = os.path.join(DB_FOLDER, filename)
 
             if os.path.exists(filepath):
                 flash('Файл с таким именем уже существует!')
                 return redirect(request.url)
 
-            file.save(filepath)
+            engine = request.form.get('engine', 'cascade')
+            if engine not in ENGINES:
+                engine = 'cascade'
+            # Разделы базы для сравнения; работа добавляется в первый из них
+            partition_names = list(partitions.select(request.form.getlist('partition')))
+            filepath_db = partitions.corpus_path(partition_names[0], filename)
+
+            # Очередь проверок: при перегрузке загрузка отклоняется сразу
+            try:
+                admission.ensure_capacity()
+            except AdmissionRejected as e:
+                audit.alert('check_rejected', filename)
+                flash(str(e))
+                return redirect(request.url)
+
+            size, sha256 = save_upload(file, filepath)
 
             doc = SourceDocument(
                 filename=filename,
                 format=filename.rsplit('.', 1)[1].lower(),
-                size=os.path.getsize(filepath),
-                user_id=current_user.id
+                size=size,
+                sha256=sha256,
+                user_id=current_user.id,
+                check_status='queued'
             )
             db.session.add(doc)
             db.session.commit()
+            audit.record('upload', filename)
 
-            processed_id = simulate_preprocessing(doc)
-            simulate_analysis(processed_id, current_user.id, filepath)
+            jobs.submit('check', run_check, doc.id, current_user.id,
+                        filepath, filepath_db, engine, partition_names,
+                        title=f'Проверка {filename}', owner_id=current_user.id, key=doc.id)
             flash('Документ загружен. Обработка начата.')
 
-            shutil.copy2(filepath, filepath_db)
-
             return redirect(url_for('student.analysis_wait', doc_id=doc.id))
         else:
             flash('Неподдерживаемый формат файла')
-    return render_template('student/upload.html')
+    return render_template('student/upload.html', engines=ENGINES,
+                           partitions=partitions.names(), partition_titles=PARTITION_TITLES,
+                           default_partition=GLOBAL_PARTITION)
 
 
 @bp.route('/preprocessing_wait/<int:doc_id>')
@@ -83,6 +122,70 @@ def analysis_wait(doc_id):
     return render_template('student/analysis_wait.html', doc_id=doc_id)
 
 
+@bp.route('/check_status/<int:doc_id>')
+@login_required
+def check_status(doc_id):
+    """Ход проверки документа потоком Server-Sent Events."""
+    doc = SourceDocument.query.get_or_404(doc_id)
+    if doc.user_id != current_user.id:
+        return Response(status=403)
+    ready_url = url_for('student.report_ready', doc_id=doc_id)
+    job = jobs.find('check', doc_id)
+
+    if job is None:
+        # Задачи нет в памяти процесса: результат ищется в базе
+        processed = ProcessedText.query.filter_by(doc_id=doc_id).first()
+        check = processed and PlagiarismCheck.query.filter_by(
+            doc_id=processed.id).first()
+        heartbeat = doc.check_updated or doc.upload_date
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if check or doc.check_status == 'completed':
+            state = {'status': 'completed', 'stage': 'Отчёт готов', 'progress': 100}
+        elif doc.check_status == 'error':
+            state = {'status': 'error', 'stage': '', 'progress': 0,
+                     'message': doc.check_error or 'Проверка завершилась ошибкой'}
+        elif processed and processed.status == 'error':
+            state = {'status': 'error', 'stage': '', 'progress': 0,
+                     'message': 'Не удалось извлечь текст документа'}
+        elif (heartbeat is None or (now - heartbeat).total_seconds()
+              > current_app.config['CHECK_STALE_AFTER']):
+            # Отметка давно не обновлялась: процесс проверки перезапущен
+            state = {'status': 'error', 'stage': '', 'progress': 0,
+                     'message': 'Проверка прервана, загрузите документ заново'}
+        else:
+            # Проверка идёт в другом рабочем процессе (serve.py): ход берётся
+            # из отметки, браузер переподключится через STATUS_RETRY мс
+            state = {'status': 'running',
+                     'stage': doc.check_stage or 'Проверка выполняется',
+                     'progress': doc.check_progress or 0}
+        state['url'] = ready_url
+        return Response(f'retry: {STATUS_RETRY}\ndata: {json.dumps(state)}\n\n',
+                        mimetype='text/event-stream')
+
+    def events():
+        # Генератор работает после завершения запроса: сессия БД
+        # к этому моменту уже освобождена
+        sent = None
+        deadline = time.monotonic() + STATUS_STREAM_TIMEOUT
+        while True:
+            with jobs.changed:
+                state = dict(job.to_dict(), url=ready_url)
+                if state == sent and job.active:
+                    jobs.changed.wait(STATUS_KEEPALIVE)
+                    state = dict(job.to_dict(), url=ready_url)
+            if state != sent:
+                yield f'data: {json.dumps(state)}\n\n'
+                sent = state
+            else:
+                yield ': keep-alive\n\n'
+            if not job.active or time.monotonic() > deadline:
+                return
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
+
+
 @bp.route('/report_ready/<int:doc_id>')
 @login_required
 def report_ready(doc_id):
@@ -90,10 +193,16 @@ def report_ready(doc_id):
     if doc.user_id != current_user.id:
         flash('Нет доступа')
         return redirect(url_for('student.dashboard'))
+    if doc.check_status == 'error':
+        flash(f'Ошибка проверки: {doc.check_error}')
+        return redirect(url_for('student.dashboard'))
     processed = ProcessedText.query.filter_by(doc_id=doc_id).first()
     if not processed:
         flash('Обработка не завершена')
         return redirect(url_for('student.analysis_wait', doc_id=doc_id))
+    if processed.status == 'error':
+        flash('Не удалось извлечь текст документа')
+        return redirect(url_for('student.dashboard'))
     check = PlagiarismCheck.query.filter_by(doc_id=processed.id).order_by(
         PlagiarismCheck.check_date.desc()).first()
     if not check:
@@ -123,8 +232,31 @@ def export_report(report_id):
     if report.user_id != current_user.id:
         flash('Нет доступа')
         return redirect(url_for('student.dashboard'))
-    flash('Экспорт в PDF выполнен (заглушка)')
-    return redirect(url_for('student.view_report', report_id=report_id))
+    if not REPORTLAB_AVAILABLE:
+        flash('Экспорт в PDF недоступен: не установлен reportlab')
+        return redirect(url_for('student.view_report', report_id=report_id))
+
+    version = report_version(report)
+    path = artifacts.get('report', report.id, version, '.pdf')
+    if path:
+        # Готовый файл отдаётся с диска; ETag — версия содержимого, поэтому
+        # повторная загрузка без изменений отчёта получает 304
+        response = send_file(path, mimetype='application/pdf', as_attachment=True,
+                             download_name=f'report_{report.id}.pdf',
+                             conditional=True, etag=version)
+        response.cache_control.private = True
+        return response
+
+    # Файла этой версии нет: PDF создаётся фоновой задачей, страница
+    # ожидания обновляется, пока файл не появится
+    key = (report.id, version)
+    job = jobs.find('export_pdf', key)
+    if job is None or (job.status == 'error' and request.args.get('retry')) \
+            or job.status == 'completed':
+        job = jobs.submit('export_pdf', export_report_pdf, report.id,
+                          title=f'PDF отчёта #{report.id}',
+                          owner_id=current_user.id, key=key)
+    return render_template('student/export_wait.html', report=report, job=job)
 
 
 @bp.route('/history')
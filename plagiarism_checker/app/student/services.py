@@ -1,7 +1,22 @@
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import current_app
 from app import db
+from app.audit import audit, LEVEL_ERROR
+from app.admission import admission, PRIORITY_STUDENT
+from app.artifacts import artifacts
 from app.models import SourceDocument, ProcessedText, PlagiarismCheck, Report
+from app.core.extraction import extract_text, ExtractionError
 from app.core.plagiarism_check import check_document_originality as cdo
-from config import DB_FOLDER
+from app.report_pdf import (report_version, highlight_spans, render_report_pdf,
+                            PDF_TEXT_LIMIT, PDF_HIGHLIGHT_SOURCES)
+from app.settings import get_cascade_settings, get_window_settings
+from app.partitions import partitions
+from app.statistics import record_report
+from app.uploads import link_into_corpus, discard_upload
+from config import DB_FOLDER, INDEX_FOLDER
 
 SUPPORTED_FORMATS = {'txt', 'pdf', 'docx'}
 
@@ -10,23 +25,46 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in SUPPORTED_FORMATS
 
 
-def simulate_preprocessing(doc: SourceDocument):
-    processed = ProcessedText(
-        doc_id=doc.id,
-        extracted_text="Заглушенный обработанный текст...",
-        status='completed'
-    )
+def simulate_preprocessing(doc: SourceDocument, filepath):
+    """
+    Извлечение текста документа в изолированном процессе.
+    При ошибке или превышении ограничений статус обработки — 'error',
+    а ExtractionError передаётся вызывающему.
+    """
+    processed = ProcessedText(doc_id=doc.id, status='pending')
     db.session.add(processed)
     db.session.commit()
+    try:
+        processed.extracted_text = extract_text(filepath)
+        processed.status = 'completed'
+    except ExtractionError:
+        processed.status = 'error'
+        raise
+    finally:
+        db.session.commit()
     return processed.id
 
 
-def simulate_analysis(processed_text_id: int, user_id: int, filepath):
-    uniqueness = cdo(filepath, DB_FOLDER)
+def simulate_analysis(processed_text_id: int, user_id: int, filepath,
+                      engine: str = 'cascade', progress=None, partition_names=None):
+    processed = db.session.get(ProcessedText, processed_text_id)
+    details = {}
+    selected = partitions.select(partition_names or [])
+    uniqueness = cdo(filepath, DB_FOLDER, INDEX_FOLDER,
+                     get_cascade_settings(), engine=engine,
+                     text=processed.extracted_text, progress=progress,
+                     details=details, windows=get_window_settings(),
+                     partitions=selected)
     check = PlagiarismCheck(
         doc_id=processed_text_id,
         user_id=user_id,
-        uniqueness_percentage=uniqueness
+        uniqueness_percentage=uniqueness,
+        corpus_version=details.get('corpus_version'),
+        best_similarity=details.get('similarity'),
+        best_source=details.get('best_source'),
+        window_profile=json.dumps(details['profile'], ensure_ascii=False)
+        if 'profile' in details else None,
+        partitions=','.join(selected)
     )
     db.session.add(check)
     db.session.commit()
@@ -37,5 +75,121 @@ def simulate_analysis(processed_text_id: int, user_id: int, filepath):
         uniqueness_percentage=uniqueness
     )
     db.session.add(report)
+    record_report(report)
     db.session.commit()
+
+    message = f'{processed.document.filename}: уникальность {uniqueness}%'
+    audit.record('check', message, user_id=user_id)
+    if uniqueness < current_app.config['AUDIT_LOW_UNIQUENESS']:
+        audit.alert('low_uniqueness', message, user_id=user_id)
     return report.id
+
+
+def run_check(job, doc_id: int, user_id: int, filepath, corpus_path,
+              engine: str = 'cascade', partition_names=None):
+    """
+    Фоновая проверка документа студента с передачей хода в задачу.
+    Итог (completed или error с текстом ошибки) записывается в документ.
+    """
+    try:
+        job.update(stage='Ожидание в очереди', progress=0)
+        with _heartbeat(job, doc_id), admission.admit(PRIORITY_STUDENT):
+            job.update(stage='Извлечение текста', progress=1)
+            try:
+                processed_id = simulate_preprocessing(
+                    db.session.get(SourceDocument, doc_id), filepath)
+            except ExtractionError as e:
+                audit.alert('check_failed', f'Документ #{doc_id}: {e}', user_id=user_id,
+                            level=LEVEL_ERROR)
+                raise ValueError(f'Не удалось извлечь текст: {e}')
+            report_id = simulate_analysis(
+                processed_id, user_id, filepath, engine,
+                progress=lambda stage, percent: job.update(stage=stage, progress=percent),
+                partition_names=partition_names)
+        link_into_corpus(filepath, corpus_path)
+    except Exception as e:
+        discard_upload(filepath)
+        _finish_check(doc_id, 'error', str(e))
+        raise
+    _finish_check(doc_id, 'completed')
+    job.update(stage='Отчёт готов')
+    return report_id
+
+
+@contextmanager
+def _heartbeat(job, doc_id: int):
+    """
+    Запись хода проверки в документ раз в CHECK_HEARTBEAT_INTERVAL с.
+    По этой отметке другие рабочие процессы показывают ход проверки
+    и отличают идущую проверку от потерянной.
+    """
+    app = current_app._get_current_object()
+    interval = app.config['CHECK_HEARTBEAT_INTERVAL']
+    stop = threading.Event()
+
+    def beat():
+        with app.app_context():
+            while True:
+                try:
+                    db.session.execute(
+                        db.update(SourceDocument).where(SourceDocument.id == doc_id)
+                        .values(check_stage=job.stage[:100], check_progress=job.progress,
+                                check_updated=datetime.now(timezone.utc).replace(tzinfo=None)))
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Не удалось записать ход проверки документа #%s',
+                                         doc_id)
+                if stop.wait(interval):
+                    break
+            db.session.remove()
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{doc_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _finish_check(doc_id: int, status: str, error: str = None) -> None:
+    db.session.rollback()
+    db.session.execute(db.update(SourceDocument).where(SourceDocument.id == doc_id)
+                       .values(check_status=status,
+                               check_error=error[:500] if error else None))
+    db.session.commit()
+
+
+def export_report_pdf(job, report_id: int) -> str:
+    """
+    Фоновое создание PDF отчёта в хранилище файлов.
+    Возвращает версию содержимого, под которой сохранён файл.
+    """
+    from app.core.corpus_index import get_corpus_index
+
+    report = db.session.get(Report, report_id)
+    version = report_version(report)
+    if artifacts.get('report', report.id, version, '.pdf'):
+        return version
+    check = report.check
+    text = check.processed_text.extracted_text or ''
+
+    job.update(stage='Поиск совпадающих фрагментов', progress=10)
+    index = get_corpus_index(DB_FOLDER, INDEX_FOLDER)
+    names = [check.best_source] + [window[3] for window in
+                                   (check.profile or {}).get('windows', [])]
+    sources = []
+    for name in dict.fromkeys(names):
+        tokens = partitions.source_tokens(name) if name else None
+        if tokens is not None:
+            sources.append(tokens)
+        if len(sources) >= PDF_HIGHLIGHT_SOURCES:
+            break
+    spans = highlight_spans(text[:PDF_TEXT_LIMIT], sources,
+                            index.remove_stopwords, index.lemmatize)
+
+    job.update(stage='Формирование PDF', progress=50)
+    data = render_report_pdf(report, text, spans, current_app.config['PDF_FONT_PATH'])
+    artifacts.put('report', report.id, version, '.pdf', data)
+    return version
@@ -1,5 +1,4 @@
 import os
-import shutil
 from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app import db
@@ -8,7 +7,17 @@ from app.teacher import bp
 from app.teacher.services import get_all_students, get_student_by_id, get_reports_for_student, get_all_reports
 from app.teacher.services import allowed_file, simulate_preprocessing, simulate_analysis
 from werkzeug.utils import secure_filename
-from config import UPLOAD_FOLDER, DB_FOLDER
+from app.admission import admission, AdmissionRejected, PRIORITY_TEACHER
+from app.core.stages import ENGINES
+from app.core.extraction import ExtractionError
+from app.uploads import save_upload, link_into_corpus, discard_upload
+from app.partitions import partitions, PARTITION_TITLES, GLOBAL_PARTITION
+from app.statistics import report_statistics
+from app.audit import audit, LEVEL_ERROR
+from config import UPLOAD_FOLDER
+
+
+GRADES = (2, 3, 4, 5)
 
 
 @bp.route('/dashboard')
@@ -92,8 +101,17 @@ def submit_grade(report_id):
         flash('Доступ запрещён')
         return redirect(url_for('auth.login'))
 
-    flash('Оценка выставлена (заглушка)')
     report = Report.query.get_or_404(report_id)
+    grade = request.form.get('grade', type=int)
+    if grade not in GRADES:
+        flash('Неверная оценка')
+        return redirect(url_for('teacher.grade_work', report_id=report_id))
+    previous = report.grade
+    report.grade = grade
+    db.session.commit()
+    audit.record('grade', f'Отчёт #{report.id} ({report.user.name}): '
+                          f'{previous or "—"} → {grade}')
+    flash('Оценка выставлена')
     return redirect(url_for('teacher.student_detail', student_id=report.user_id))
 
 
@@ -114,36 +132,64 @@ def upload_document():
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             filepath = os.path.join(UPLOAD_FOLDER, filename)
-            filepath_db = os.path.join(DB_FOLDER, filename)
 
             if os.path.exists(filepath):
                 flash('Файл с таким именем уже существует!')
                 return redirect(request.url)
 
-            file.save(filepath)
-
-            doc = SourceDocument(
-                filename=filename,
-                format=filename.rsplit('.', 1)[1].lower(),
-                size=os.path.getsize(filepath),
-                user_id=current_user.id
-            )
-            db.session.add(doc)
-            db.session.commit()
-
-            processed_id = simulate_preprocessing(doc)
-            simulate_analysis(processed_id, current_user.id, filepath)
-
-            flash('Документ обработан. Отчёт готов.')
-            report = Report.query.filter_by(user_id=current_user.id).order_by(
-                Report.generated_date.desc()).first()
-
-            shutil.copy2(filepath, filepath_db)
+            engine = request.form.get('engine', 'cascade')
+            if engine not in ENGINES:
+                engine = 'cascade'
+            # Разделы базы для сравнения; работа добавляется в первый из них
+            partition_names = list(partitions.select(request.form.getlist('partition')))
+            filepath_db = partitions.corpus_path(partition_names[0], filename)
+
+            # Очередь проверок: при перегрузке загрузка отклоняется сразу
+            try:
+                with admission.admit(PRIORITY_TEACHER):
+                    size, sha256 = save_upload(file, filepath)
+
+                    doc = SourceDocument(
+                        filename=filename,
+                        format=filename.rsplit('.', 1)[1].lower(),
+                        size=size,
+                        sha256=sha256,
+                        user_id=current_user.id
+                    )
+                    db.session.add(doc)
+                    db.session.commit()
+                    audit.record('upload', filename)
+
+                    try:
+                        processed_id = simulate_preprocessing(doc, filepath)
+                    except ExtractionError as e:
+                        discard_upload(filepath)
+                        audit.alert('check_failed', f'{filename}: {e}', level=LEVEL_ERROR)
+                        flash(f'Не удалось извлечь текст: {e}')
+                        return redirect(request.url)
+                    try:
+                        simulate_analysis(processed_id, current_user.id, filepath, engine,
+                                          partition_names)
+                    except Exception:
+                        discard_upload(filepath)
+                        raise
+
+                    flash('Документ обработан. Отчёт готов.')
+                    report = Report.query.filter_by(user_id=current_user.id).order_by(
+                        Report.generated_date.desc()).first()
+
+                    link_into_corpus(filepath, filepath_db)
+            except AdmissionRejected as e:
+                audit.alert('check_rejected', filename)
+                flash(str(e))
+                return redirect(request.url)
 
             return redirect(url_for('teacher.view_report', report_id=report.id))
         else:
             flash('Неподдерживаемый формат файла')
-    return render_template('teacher/upload_document.html')
+    return render_template('teacher/upload_document.html', engines=ENGINES,
+                           partitions=partitions.names(), partition_titles=PARTITION_TITLES,
+                           default_partition=GLOBAL_PARTITION)
 
 
 @bp.route('/reports')
@@ -172,4 +218,4 @@ def statistics():
     if current_user.role != 'teacher':
         flash('Доступ запрещён')
         return redirect(url_for('auth.login'))
-    return render_template('teacher/statistics.html')
+    return render_template('teacher/statistics.html', stats=report_statistics())
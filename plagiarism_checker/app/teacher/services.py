@@ -1,8 +1,15 @@
+import json
 from app.models import User, Report, SourceDocument
+from flask import current_app
 from app import db
+from app.audit import audit
 from app.models import ProcessedText, PlagiarismCheck
+from app.core.extraction import extract_text, ExtractionError
 from app.core.plagiarism_check import check_document_originality as cdo
-from config import DB_FOLDER
+from app.settings import get_cascade_settings, get_window_settings
+from app.partitions import partitions
+from app.statistics import record_report
+from config import DB_FOLDER, INDEX_FOLDER
 
 
 SUPPORTED_FORMATS = {'txt', 'pdf', 'docx'}
@@ -12,23 +19,45 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in SUPPORTED_FORMATS
 
 
-def simulate_preprocessing(doc: SourceDocument):
-    processed = ProcessedText(
-        doc_id=doc.id,
-        extracted_text="Заглушенный текст (преподаватель)",
-        status='completed'
-    )
+def simulate_preprocessing(doc: SourceDocument, filepath):
+    """
+    Извлечение текста документа в изолированном процессе.
+    При ошибке или превышении ограничений статус обработки — 'error',
+    а ExtractionError передаётся вызывающему.
+    """
+    processed = ProcessedText(doc_id=doc.id, status='pending')
     db.session.add(processed)
     db.session.commit()
+    try:
+        processed.extracted_text = extract_text(filepath)
+        processed.status = 'completed'
+    except ExtractionError:
+        processed.status = 'error'
+        raise
+    finally:
+        db.session.commit()
     return processed.id
 
 
-def simulate_analysis(processed_text_id: int, user_id: int, filepath):
-    uniqueness = cdo(filepath, DB_FOLDER)
+def simulate_analysis(processed_text_id: int, user_id: int, filepath,
+                      engine: str = 'cascade', partition_names=None):
+    processed = db.session.get(ProcessedText, processed_text_id)
+    details = {}
+    selected = partitions.select(partition_names or [])
+    uniqueness = cdo(filepath, DB_FOLDER, INDEX_FOLDER,
+                     get_cascade_settings(), engine=engine,
+                     text=processed.extracted_text, details=details,
+                     windows=get_window_settings(), partitions=selected)
     check = PlagiarismCheck(
         doc_id=processed_text_id,
         user_id=user_id,
-        uniqueness_percentage=uniqueness
+        uniqueness_percentage=uniqueness,
+        corpus_version=details.get('corpus_version'),
+        best_similarity=details.get('similarity'),
+        best_source=details.get('best_source'),
+        window_profile=json.dumps(details['profile'], ensure_ascii=False)
+        if 'profile' in details else None,
+        partitions=','.join(selected)
     )
     db.session.add(check)
     db.session.commit()
@@ -39,7 +68,13 @@ def simulate_analysis(processed_text_id: int, user_id: int, filepath):
         uniqueness_percentage=uniqueness
     )
     db.session.add(report)
+    record_report(report)
     db.session.commit()
+
+    message = f'{processed.document.filename}: уникальность {uniqueness}%'
+    audit.record('check', message, user_id=user_id)
+    if uniqueness < current_app.config['AUDIT_LOW_UNIQUENESS']:
+        audit.alert('low_uniqueness', message, user_id=user_id)
     return report.id
 
 
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from config import UPLOAD_FOLDER
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadFile:
+    """
+    Временный файл загрузки в UPLOAD_FOLDER.
+    Размер и SHA-256 считаются по мере записи тела запроса, поэтому
+    после разбора формы файл не нужно перечитывать.
+    """
+
+    def __init__(self, directory: str, max_size: int = None):
+        self._file = tempfile.NamedTemporaryFile(
+            dir=directory, prefix='.upload-', delete=False)
+        self._hash = hashlib.sha256()
+        self._stored = False
+        self.size = 0
+        self.max_size = max_size
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def store(self, path: str) -> None:
+        """Публикует файл под постоянным именем без копирования данных."""
+        self._file.flush()
+        # link не перезаписывает существующий файл, в отличие от replace
+        os.link(self._file.name, path)
+        os.unlink(self._file.name)
+        self._stored = True
+
+    def close(self) -> None:
+        self._file.close()
+        if not self._stored and os.path.exists(self._file.name):
+            os.unlink(self._file.name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """
+    Запрос, который пишет загружаемые файлы сразу в UPLOAD_FOLDER.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return HashingUploadFile(
+            UPLOAD_FOLDER, current_app.config.get('MAX_CONTENT_LENGTH'))
+
+
+def save_upload(file, path: str):
+    """
+    Сохраняет загруженный файл по пути path.
+    Возвращает (размер в байтах, SHA-256).
+    """
+    stream = file.stream
+    if isinstance(stream, HashingUploadFile):
+        stream.store(path)
+        return stream.size, stream.sha256
+
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'xb') as out:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+            out.write(chunk)
+    return size, digest.hexdigest()
+
+
+def link_into_corpus(path: str, corpus_path: str) -> None:
+    """
+    Добавляет файл в базу источников жёсткой ссылкой.
+    Если ссылку создать нельзя (другая файловая система), файл копируется.
+    """
+    tmp_path = corpus_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    try:
+        os.link(path, tmp_path)
+    except OSError:
+        shutil.copy2(path, tmp_path)
+    os.replace(tmp_path, corpus_path)
+
+
+def discard_upload(path: str) -> None:
+    """
+    Удаляет загрузку, проверка которой не удалась, чтобы файл
+    с тем же именем можно было загрузить заново.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
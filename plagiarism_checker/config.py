@@ -3,6 +3,10 @@ from datetime import timedelta
 
 UPLOAD_FOLDER = os.path.abspath(".") + '_uploads'
 DB_FOLDER = os.path.abspath(".") + '_DB'
+INDEX_FOLDER = os.path.abspath(".") + '_index'
+BACKUP_FOLDER = os.path.abspath(".") + '_backups'
+LOG_FOLDER = os.path.abspath(".") + '_logs'
+ARTIFACT_FOLDER = os.path.abspath(".") + '_artifacts'
 
 
 class Config:
@@ -11,3 +15,56 @@ class Config:
         'DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
+    # Максимальный размер загружаемого файла, байт
+    MAX_CONTENT_LENGTH = int(os.environ.get(
+        'MAX_UPLOAD_SIZE', 20 * 1024 * 1024))
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    # Файл журнала в LOG_FOLDER (пустое значение — только вывод в консоль);
+    # ротацию выполняет внешний logrotate, файл открывается заново сам
+    LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+    # Загружать индекс базы источников при старте, а не при первой проверке
+    CORPUS_WARM_ON_START = os.environ.get('CORPUS_WARM_ON_START') == '1'
+    # Контроль допуска: одновременные проверки, длина очереди и время ожидания, с
+    MAX_CONCURRENT_CHECKS = int(os.environ.get(
+        'MAX_CONCURRENT_CHECKS', os.cpu_count() or 2))
+    MAX_CHECK_QUEUE = int(os.environ.get('MAX_CHECK_QUEUE', 32))
+    CHECK_QUEUE_TIMEOUT = float(os.environ.get('CHECK_QUEUE_TIMEOUT', 60))
+    # Фоновая проверка раз в CHECK_HEARTBEAT_INTERVAL с записывает свой ход
+    # в документ; проверка без отметки дольше CHECK_STALE_AFTER с считается
+    # потерянной (процесс перезапущен)
+    CHECK_HEARTBEAT_INTERVAL = float(os.environ.get('CHECK_HEARTBEAT_INTERVAL', 10))
+    CHECK_STALE_AFTER = float(os.environ.get('CHECK_STALE_AFTER', 90))
+    # Извлечение текста PDF/DOCX в отдельных процессах: число процессов,
+    # время на документ (с) и лимит памяти процесса (МБ)
+    EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', 2))
+    EXTRACTION_TIMEOUT = float(os.environ.get('EXTRACTION_TIMEOUT', 30))
+    EXTRACTION_MEMORY_LIMIT_MB = int(os.environ.get('EXTRACTION_MEMORY_LIMIT_MB', 512))
+    # Срок жизни кэша пользователей сессий (роль и имя), с; 0 — без кэша
+    IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    # Длинные документы (от CHECK_WINDOWED_MIN_CHARS символов) проверяются
+    # окнами по CHECK_WINDOW_TOKENS слов (0 — всегда целиком); проверка
+    # останавливается, когда после CHECK_WINDOW_STOP_MIN_WINDOWS окон среднее
+    # сходство достигло CHECK_WINDOW_STOP_SIMILARITY (0 — без остановки)
+    CHECK_WINDOW_TOKENS = int(os.environ.get('CHECK_WINDOW_TOKENS', 1000))
+    CHECK_WINDOWED_MIN_CHARS = int(os.environ.get('CHECK_WINDOWED_MIN_CHARS', 200000))
+    CHECK_WINDOW_STOP_SIMILARITY = float(os.environ.get('CHECK_WINDOW_STOP_SIMILARITY', 0.8))
+    CHECK_WINDOW_STOP_MIN_WINDOWS = int(os.environ.get('CHECK_WINDOW_STOP_MIN_WINDOWS', 3))
+    # Сжатие индекса источников запускается после удаления, когда доля
+    # устаревших записей журнала превышает CORPUS_COMPACT_RATIO
+    CORPUS_COMPACT_RATIO = float(os.environ.get('CORPUS_COMPACT_RATIO', 0.2))
+    # Сколько индексов разделов базы держать в памяти процесса; давно не
+    # использованные выгружаются (общая база остаётся всегда)
+    CORPUS_CACHED_INDEXES = int(os.environ.get('CORPUS_CACHED_INDEXES', 8))
+    # Журнал аудита: события пишутся пачками фоновым потоком раз в
+    # AUDIT_FLUSH_INTERVAL с или по AUDIT_BATCH_SIZE; в памяти — не больше
+    # AUDIT_BUFFER_LIMIT событий. Отчёт с уникальностью ниже
+    # AUDIT_LOW_UNIQUENESS, %, отмечается оповещением
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_BUFFER_LIMIT = int(os.environ.get('AUDIT_BUFFER_LIMIT', 100000))
+    AUDIT_LOW_UNIQUENESS = float(os.environ.get('AUDIT_LOW_UNIQUENESS', 30))
+    # Процессов для хеширования паролей при массовом импорте пользователей
+    USER_IMPORT_WORKERS = int(os.environ.get('USER_IMPORT_WORKERS', os.cpu_count() or 2))
+    # TTF-шрифт с кириллицей для экспорта отчётов в PDF (пусто — поиск
+    # DejaVuSans в системных каталогах)
+    PDF_FONT_PATH = os.environ.get('PDF_FONT_PATH', '')
@@ -0,0 +1 @@
+# Каталог приложения попадает в sys.path, чтобы тесты импортировали пакет app
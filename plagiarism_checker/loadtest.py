@@ -0,0 +1,274 @@
+"""
+Нагрузочное тестирование приложения через настоящие маршруты.
+
+Виртуальные пользователи работают в нескольких локальных процессах
+(по несколько потоков в каждом) и выполняют сценарии:
+студент — вход, загрузка документа, ожидание анализа, просмотр отчёта;
+преподаватель — вход и список отчётов. Документы (TXT и DOCX разного
+размера) генерируются случайно. В конце выводятся пропускная способность
+и задержки p50/p95/p99 по каждому маршруту.
+
+Загруженные документы попадают в базу источников, поэтому тест следует
+запускать на отдельной копии данных:
+
+    python serve.py --workers 4 --port 8000
+    python loadtest.py --url http://127.0.0.1:8000 --processes 4 --users 8 --duration 60
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+# (формат, число слов, вес в смеси документов)
+DEFAULT_MIX = 'txt:300:5,txt:3000:3,docx:1500:2,txt:20000:1'
+CHECK_TIMEOUT = 300
+STATUS_RETRY = 2.0
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """HTTP-клиент виртуального пользователя со своими cookies и замерами."""
+
+    def __init__(self, base_url: str, results: list):
+        self.base_url = base_url
+        self.results = results
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, endpoint: str, path: str, data: bytes = None,
+                headers: dict = None, stream: bool = False):
+        """(код ответа, заголовки, тело); время запроса записывается под endpoint."""
+        request = Request(urljoin(self.base_url, path), data=data,
+                          headers=headers or {})
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(request, timeout=CHECK_TIMEOUT)
+        except HTTPError as e:
+            response = e
+        with response:
+            status, response_headers = response.status, response.headers
+            body = self._read_events(response) if stream else response.read()
+        self.results.append((endpoint, time.perf_counter() - started, status))
+        return status, response_headers, body
+
+    @staticmethod
+    def _read_events(response) -> dict:
+        """Чтение потока SSE до завершения задачи; последнее состояние."""
+        state = {}
+        for line in response:
+            line = line.decode('utf-8').strip()
+            if line.startswith('data:'):
+                state = json.loads(line[5:])
+                if state.get('status') in ('completed', 'error'):
+                    break
+        return state
+
+    def login(self, email: str, password: str) -> None:
+        self.request('auth.login', '/auth/login',
+                     urlencode({'email': email, 'password': password}).encode(),
+                     {'Content-Type': 'application/x-www-form-urlencoded'})
+
+
+def make_text(words: int, rng: random.Random) -> str:
+    vocabulary = [''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 10)))
+                  for _ in range(2000)]
+    return ' '.join(rng.choice(vocabulary) for _ in range(words))
+
+
+def make_docx(text: str) -> bytes:
+    """Минимальный DOCX без python-docx."""
+    paragraphs = ''.join(
+        f'<w:p><w:r><w:t>{line}</w:t></w:r></w:p>'
+        for line in re.findall(r'(?:\S+\s+){1,100}', text + ' '))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'))
+        archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+            '</Relationships>'))
+        archive.writestr('word/document.xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+            f'wordprocessingml/2006/main"><w:body>{paragraphs}</w:body></w:document>'))
+    return buffer.getvalue()
+
+
+def parse_mix(mix: str) -> list:
+    result = []
+    for item in mix.split(','):
+        fmt, words, weight = item.split(':')
+        result.append((fmt, int(words), int(weight)))
+    return result
+
+
+def multipart(fields: dict, filename: str, content: bytes):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; '
+                     f'name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                 f'filename="{filename}"\r\n'
+                 'Content-Type: application/octet-stream\r\n\r\n'.encode())
+    parts.append(content)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def student_session(client: Client, args, rng: random.Random, mix: list) -> None:
+    fmt, words, _ = rng.choices(mix, weights=[w for _, _, w in mix])[0]
+    text = make_text(words, rng)
+    content = make_docx(text) if fmt == 'docx' else text.encode('utf-8')
+    filename = f'lt-{uuid.uuid4().hex[:12]}.{fmt}'
+    body, headers = multipart({'engine': args.engine}, filename, content)
+
+    status, response_headers, _ = client.request(
+        'student.upload', '/student/upload', body, headers)
+    location = response_headers.get('Location', '')
+    match = re.search(r'/analysis_wait/(\d+)', location)
+    if status != 302 or not match:
+        client.results.append(('student.upload (отклонено)', 0.0, status))
+        return
+    doc_id = match.group(1)
+
+    client.request('student.analysis_wait', f'/student/analysis_wait/{doc_id}')
+    # Как EventSource: переподключение, пока проверка не завершится
+    deadline = time.time() + CHECK_TIMEOUT
+    state = {}
+    while state.get('status') not in ('completed', 'error') and time.time() < deadline:
+        if state:
+            time.sleep(STATUS_RETRY)
+        _, _, state = client.request('student.check_status',
+                                     f'/student/check_status/{doc_id}', stream=True)
+    if state.get('status') != 'completed':
+        client.results.append(('student.check (ошибка)', 0.0, state.get('status')))
+        return
+    _, _, page = client.request('student.report_ready', f'/student/report_ready/{doc_id}')
+    match = re.search(rb'/view_report/(\d+)', page)
+    if match:
+        client.request('student.view_report',
+                       f'/student/view_report/{match.group(1).decode()}')
+
+
+def teacher_session(client: Client, args, rng, mix) -> None:
+    client.request('teacher.reports', '/teacher/reports')
+
+
+def run_user(args, seed: int, deadline: float, results: list) -> None:
+    rng = random.Random(seed)
+    mix = parse_mix(args.mix)
+    teacher = rng.random() < args.teacher_share
+    client = Client(args.url, results)
+    if teacher:
+        client.login(args.teacher_email, args.password)
+    else:
+        client.login(args.student_email, args.password)
+    while time.time() < deadline:
+        try:
+            if teacher:
+                teacher_session(client, args, rng, mix)
+            else:
+                student_session(client, args, rng, mix)
+        except OSError as e:
+            results.append(('ошибка соединения', 0.0, type(e).__name__))
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think))
+
+
+def run_process(args, process_number: int, deadline: float) -> list:
+    results = []
+    threads = [threading.Thread(target=run_user,
+                                args=(args, process_number * 1000 + i, deadline, results))
+               for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(values: list, p: float) -> float:
+    """Процентиль по ближайшему рангу (values отсортирован)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+def report(results: list, elapsed: float) -> None:
+    by_endpoint = defaultdict(list)
+    errors = defaultdict(int)
+    for endpoint, latency, status in results:
+        by_endpoint[endpoint].append(latency)
+        if not isinstance(status, int) or status >= 400:
+            errors[endpoint] += 1
+
+    print(f'Длительность: {elapsed:.1f} с, запросов: {len(results)}, '
+          f'{len(results) / elapsed:.1f} запр/с')
+    print(f"{'Маршрут':<32}{'запросов':>9}{'ошибок':>8}{'запр/с':>9}"
+          f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for endpoint in sorted(by_endpoint):
+        latencies = sorted(by_endpoint[endpoint])
+        print(f'{endpoint:<32}{len(latencies):>9}{errors[endpoint]:>8}'
+              f'{len(latencies) / elapsed:>9.2f}'
+              f'{1000 * percentile(latencies, 50):>10.1f}'
+              f'{1000 * percentile(latencies, 95):>10.1f}'
+              f'{1000 * percentile(latencies, 99):>10.1f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--processes', type=int, default=2,
+                        help='Число процессов генератора нагрузки.')
+    parser.add_argument('--users', type=int, default=4,
+                        help='Виртуальных пользователей на процесс.')
+    parser.add_argument('--duration', type=float, default=30, help='Длительность, с.')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='Средняя пауза пользователя между сценариями, с.')
+    parser.add_argument('--teacher-share', type=float, default=0.2,
+                        help='Доля пользователей-преподавателей.')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Смесь документов: формат:слов:вес через запятую.')
+    parser.add_argument('--engine', default='cascade', choices=['cascade', 'lsa'])
+    parser.add_argument('--student-email', default='student@example.com')
+    parser.add_argument('--teacher-email', default='teacher@example.com')
+    parser.add_argument('--password', default='123')
+    args = parser.parse_args()
+
+    started = time.time()
+    deadline = started + args.duration
+    with multiprocessing.Pool(args.processes) as pool:
+        parts = pool.starmap(run_process,
+                             [(args, i, deadline) for i in range(args.processes)])
+    report([result for part in parts for result in part], time.time() - started)
+
+
+if __name__ == '__main__':
+    main()
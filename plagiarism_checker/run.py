@@ -1,6 +1,7 @@
 import os
 from app import create_app
 from app.auth.utils import create_demo_users
+from app.schema import init_schema
 from config import UPLOAD_FOLDER, DB_FOLDER
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -8,6 +9,9 @@ os.makedirs(DB_FOLDER, exist_ok=True)
 app = create_app()
 
 if __name__ == '__main__':
+    # Для разработки схема создаётся при запуске; в остальных
+    # случаях — командой flask --app run init-db
     with app.app_context():
+        init_schema()
         create_demo_users()
     app.run(debug=True)
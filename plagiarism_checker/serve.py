@@ -0,0 +1,152 @@
+"""
+Запуск с предзагрузкой: главный процесс создаёт приложение, загружает
+индекс базы, признаки документов и модель LSA, после чего порождает
+рабочие процессы через fork. Загруженные объекты исключаются из сборки
+мусора (gc.freeze), поэтому их страницы памяти остаются общими для всех
+процессов (copy-on-write) и каждый новый процесс почти не добавляет памяти.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from app import create_app, db
+from app.schema import init_schema
+from config import UPLOAD_FOLDER, DB_FOLDER, INDEX_FOLDER
+
+# Модули, которые загружаются до fork, чтобы не импортироваться в каждом процессе
+PRELOAD_MODULES = ('numpy', 'app.core.cascade', 'app.core.corpus_index',
+                   'app.core.lsa', 'app.core.plagiarism_check')
+
+
+def preload(app) -> None:
+    """Загрузка всего, что должно быть общим для рабочих процессов."""
+    import importlib
+    from app.core.corpus_index import warm_corpus_cache
+
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    started = time.perf_counter()
+    index = warm_corpus_cache(DB_FOLDER, INDEX_FOLDER)
+    app.logger.info('Индекс загружен: %d документов за %.1f с',
+                    len(index.entries), time.perf_counter() - started)
+    with app.app_context():
+        # Соединения с БД не должны наследоваться процессами
+        db.engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def memory_usage(pid: int) -> dict:
+    """Rss, Pss и собственная (Private) память процесса, КБ (только Linux)."""
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    usage[name] = int(value.split()[0])
+    except OSError:
+        return {}
+    usage['Private'] = usage.pop('Private_Clean', 0) + usage.pop('Private_Dirty', 0)
+    return usage
+
+
+def run_worker(app, listener: socket.socket, threads: bool) -> None:
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=threads,
+                         fd=listener.fileno())
+    server.serve_forever()
+
+
+def serve(app, host: str, port: int, workers: int, threads: bool,
+          memory_report: bool) -> None:
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    children = set()
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, listener, threads)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    app.logger.info('Сервер http://%s:%d, процессов: %d', host, port, workers)
+    if memory_report:
+        time.sleep(1)
+        report = {'master': memory_usage(os.getpid())}
+        report.update((pid, memory_usage(pid)) for pid in children)
+        for name, usage in report.items():
+            app.logger.info('Память %s: %s', name, ', '.join(
+                f'{key} {value // 1024} МБ' for key, value in usage.items()))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            app.logger.warning('Процесс %d завершился (код %d), запускается новый',
+                               pid, os.waitstatus_to_exitcode(status))
+            spawn()
+    listener.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('SERVE_WORKERS', 4)))
+    parser.add_argument('--no-threads', action='store_true',
+                        help='Обрабатывать запросы процесса по одному.')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='Вывести память процессов после запуска (Linux).')
+    args = parser.parse_args()
+
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(DB_FOLDER, exist_ok=True)
+    app = create_app()
+    with app.app_context():
+        # Схема создаётся (и дополняется новыми столбцами) до fork
+        added = init_schema()
+    if added:
+        app.logger.info('Добавлены столбцы: %s', ', '.join(added))
+    preload(app)
+    serve(app, args.host, args.port, args.workers, not args.no_threads,
+          args.memory_report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from app.core.cascade import CascadeScorer, corpus_features
+from app.core.corpus_index import CorpusIndex
+from app.core.set_similarity import jaccard
+
+
+def build_features(tmp_path, documents):
+    database_dir = tmp_path / 'db'
+    database_dir.mkdir()
+    for name, text in documents.items():
+        (database_dir / name).write_text(text, encoding='utf-8')
+    index = CorpusIndex.load(str(database_dir), str(tmp_path / 'index'))
+    index.build(workers=1)
+    return corpus_features(index)
+
+
+def test_encode_gives_one_id_per_unknown_token(tmp_path):
+    features = build_features(tmp_path, {'a.txt': 'альфа бета гамма'})
+    ids = features.vocabulary.encode(['нов', 'нов', 'нов', 'другой'])
+    assert ids[0] == ids[1] == ids[2] < 0
+    assert ids[3] < 0 and ids[3] != ids[0]
+
+
+def test_jaccard_stage_matches_set_jaccard_with_unknown_tokens(tmp_path):
+    words = ['слово%s' % letter for letter in 'абвгдежзиклмнопрст']
+    features = build_features(tmp_path, {
+        'a.txt': ' '.join(words[:12]),
+        'b.txt': ' '.join(words[6:]),
+    })
+    documents = [set(features.vocabulary.decode(features.tokens(i)))
+                 for i in range(len(features))]
+    # Повторы слов, которых нет в базе, не должны раздувать множество запроса
+    query = words[3:10] + ['незнакомое'] * 5 + ['ещёодно'] * 3
+    scores = CascadeScorer._stage_jaccard(
+        features, {'ids': features.vocabulary.encode(query)},
+        np.arange(len(features)), 0.0)
+    expected = [jaccard(set(query), document) for document in documents]
+    assert scores.tolist() == pytest.approx(expected)
+
+
+def test_excerpt_of_large_source_is_found(tmp_path):
+    # Фрагмент в 300 слов из источника в 8000 слов: мера Жаккара с ним
+    # мала, но источник должен дойти до оценки TF-IDF
+    from app.core.plagiarism_check import check_document_originality
+
+    rng = np.random.RandomState(0)
+    alphabet = list('абвгдежзиклмнопрстуфхцчшщэюя')
+    vocabulary = [''.join(rng.choice(alphabet, 8)) for _ in range(50000)]
+    source = [vocabulary[i] for i in rng.randint(0, len(vocabulary), 8000)]
+    documents = {'source.txt': ' '.join(source)}
+    for number in range(29):
+        documents[f'other{number}.txt'] = ' '.join(
+            vocabulary[i] for i in rng.randint(0, len(vocabulary), 300))
+    features = build_features(tmp_path, documents)
+    excerpt = tmp_path / 'excerpt.txt'
+    excerpt.write_text(' '.join(source[4000:4300]), encoding='utf-8')
+
+    details = {}
+    originality = check_document_originality(
+        str(excerpt), features.index.database_dir, str(tmp_path / 'index'),
+        details=details)
+    assert details['best_source'] == 'source.txt'
+    assert originality < 100.0